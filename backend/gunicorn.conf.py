@@ -0,0 +1,84 @@
+# Multi-worker serving mode
+#
+#   gunicorn -c backend/gunicorn.conf.py backend.main:app
+#
+# - The app (and the MiniLM model) is imported once in the master and shared
+#   copy-on-write with every worker (preload_app).
+# - Answer, PubMed and web-page caches live in one SQLite file, the embedding
+#   cache in a memory-mapped file — every worker sees every other's entries.
+# - Upstream rate limits (NCBI, DuckDuckGo, Groq, ...) are token buckets in the
+#   same SQLite file, so they hold for the whole server, not per worker.
+# - Uploads are queued; a single ingestion process forked from the master
+#   embeds them, so API workers never compete for CPU with large ingests.
+#   The master respawns it if it dies; jobs it left 'running' are retried.
+import gc
+import multiprocessing
+import os
+import threading
+import time
+
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+os.environ.setdefault("SHARED_CACHE_PATH", "./shared_cache.sqlite3")
+os.environ.setdefault("INGESTION_MODE", "queue")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+
+_ingestion = {"process": None, "stop": None}
+INGESTION_SUPERVISE_INTERVAL = float(os.getenv("INGESTION_SUPERVISE_INTERVAL", "5"))
+
+
+def _start_ingestion(server):
+    from backend.modules.ingestion_queue import run_ingestion_worker
+
+    ctx = multiprocessing.get_context("fork")
+    stop = ctx.Event()
+    process = ctx.Process(target=run_ingestion_worker, kwargs={"stop_event": stop},
+                          name="ingestion-worker", daemon=True)
+    process.start()
+    _ingestion.update(process=process, stop=stop)
+    server.log.info(f"Ingestion worker started (pid {process.pid})")
+
+
+def _ingestion_alive(pid) -> bool:
+    # The arbiter reaps every child on SIGCHLD, so Process.is_alive() can't be trusted here
+    try:
+        return os.waitpid(pid, os.WNOHANG) == (0, 0)
+    except ChildProcessError:
+        return False
+
+
+def _supervise_ingestion(server):
+    """Respawn the ingestion worker if it dies (OOM during an embed, crash, ...)."""
+    while not _ingestion["stop"].is_set():
+        time.sleep(INGESTION_SUPERVISE_INTERVAL)
+        if not _ingestion["stop"].is_set() and not _ingestion_alive(_ingestion["process"].pid):
+            server.log.error(f"Ingestion worker (pid {_ingestion['process'].pid}) died, restarting")
+            _start_ingestion(server)
+
+
+def when_ready(server):
+    # Freeze everything loaded so far so refcount updates don't un-share the pages
+    gc.freeze()
+    _start_ingestion(server)
+    threading.Thread(target=_supervise_ingestion, args=(server,), name="ingestion-supervisor", daemon=True).start()
+
+
+def post_fork(server, worker):
+    # One torch thread pool per worker would oversubscribe the cores
+    try:
+        import torch
+        torch.set_num_threads(max(1, multiprocessing.cpu_count() // workers))
+    except ImportError:
+        pass
+
+
+def on_exit(server):
+    if _ingestion["process"] is not None:
+        _ingestion["stop"].set()
+        deadline = time.monotonic() + 30
+        while _ingestion_alive(_ingestion["process"].pid) and time.monotonic() < deadline:
+            time.sleep(0.5)
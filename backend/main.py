@@ -5,7 +5,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from backend.routes import list_reports
-from backend.middlewares.exception_handlers import catch_exception_middleware
+from backend.middlewares.exception_handlers import catch_exception_middleware, upstream_unavailable_handler
+from backend.middlewares.upload_limits import upload_size_limit_middleware
+from backend.modules.resilience import UpstreamUnavailableError
 from backend.routes.upload_pdfs import router as upload_router
 from backend.routes.ask_questions import router as ask_router
 from backend.routes import upload_and_analyze_report
@@ -26,6 +28,8 @@ app.add_middleware(
 
 # ✅ Middleware
 app.middleware("http")(catch_exception_middleware)
+app.middleware("http")(upload_size_limit_middleware)
+app.add_exception_handler(UpstreamUnavailableError, upstream_unavailable_handler)
 
 # ✅ Routers
 app.include_router(upload_router)
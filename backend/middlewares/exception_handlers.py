@@ -1,6 +1,7 @@
 from fastapi import Request
 from fastapi.responses import JSONResponse
 from backend.logger import logger
+from backend.modules.resilience import UpstreamUnavailableError
 
 
 async def catch_exception_middleware(request:Request,call_next):
@@ -8,4 +9,13 @@ async def catch_exception_middleware(request:Request,call_next):
         return await call_next(request)
     except Exception as exc:
         logger.exception("UNHANDLED EXCEPTION")
-        return JSONResponse(status_code=500,content={"error":str(exc)})
\ No newline at end of file
+        return JSONResponse(status_code=500,content={"error":str(exc)})
+
+
+async def upstream_unavailable_handler(request:Request,exc:UpstreamUnavailableError):
+    logger.warning(f"⚡ Upstream unavailable: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"error":str(exc),"upstream":exc.upstream},
+        headers={"Retry-After":str(exc.retry_after)}
+    )
\ No newline at end of file
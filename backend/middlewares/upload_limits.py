@@ -0,0 +1,23 @@
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from backend.logger import logger
+from backend.modules.pdf_handlers import MAX_UPLOAD_BYTES, MAX_UPLOAD_FILES, FORM_OVERHEAD_BYTES
+
+# Largest body each upload route can legitimately receive
+UPLOAD_REQUEST_LIMITS={
+    "/upload_pdfs/":MAX_UPLOAD_BYTES*MAX_UPLOAD_FILES+FORM_OVERHEAD_BYTES,
+    "/upload_and_analyze_lab_report/":MAX_UPLOAD_BYTES+FORM_OVERHEAD_BYTES,
+}
+
+
+async def upload_size_limit_middleware(request:Request,call_next):
+    """Refuse oversized uploads from Content-Length before the multipart body is read.
+
+    Chunked uploads carry no length; those are still capped per file while streaming to disk.
+    """
+    limit=UPLOAD_REQUEST_LIMITS.get(request.url.path)
+    content_length=request.headers.get("content-length")
+    if limit and content_length and content_length.isdigit() and int(content_length)>limit:
+        logger.warning(f"📦 Rejected {request.url.path} upload of {content_length} bytes")
+        return JSONResponse(status_code=413,content={"error":f"Upload exceeds the {limit//(1024*1024)} MB request limit"})
+    return await call_next(request)
@@ -0,0 +1,174 @@
+import os
+import uuid
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.logger import logger
+from backend.modules.llm import format_docs, get_conversation_chain
+from backend.modules.local_vector_store import normalize_rows
+from backend.modules.query_handlers import answer_cache_key, query_chain
+from backend.utils.ttl_cache import get_shared_cache
+
+# ✅ Session settings
+SESSION_TTL = int(os.getenv("SESSION_TTL", "1800"))
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "1000"))
+SESSION_MAX_DOCS = int(os.getenv("SESSION_MAX_DOCS", "30"))
+SESSION_CONTEXT_DOCS = int(os.getenv("SESSION_CONTEXT_DOCS", "8"))
+SESSION_SUFFICIENCY_THRESHOLD = float(os.getenv("SESSION_SUFFICIENCY_THRESHOLD", "0.35"))
+MAX_STORED_ANSWER_CHARS = 2000
+MAX_STORED_TURNS = 50
+
+# Shared across workers when SHARED_CACHE_PATH is set; entries expire SESSION_TTL after the last turn
+session_store = get_shared_cache("sessions", maxsize=10000, ttl=SESSION_TTL)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def compact_history(history: List[dict], token_budget: int = SESSION_HISTORY_TOKENS) -> str:
+    """Keep the most recent turns that fit the token budget; older turns are summarized as a count."""
+    kept = []
+    used = 0
+    for turn in reversed(history):
+        text = f"User: {turn['question']}\nAssistant: {turn['answer']}"
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            if not kept:
+                # Always keep the last turn, truncated to the budget
+                kept.append(text[:token_budget * 4])
+            break
+        kept.append(text)
+        used += cost
+
+    omitted = len(history) - len(kept)
+    lines = ([f"({omitted} earlier turns omitted)"] if omitted > 0 else []) + list(reversed(kept))
+    return "\n\n".join(lines) if lines else "(no previous turns)"
+
+
+def _new_session(scope: dict) -> dict:
+    return {
+        "session_id": uuid.uuid4().hex,
+        "scope": scope,
+        "docs": [],  # [(page_content, metadata)]
+        "vectors": None,  # (k, dim) float32, unit-normalized rows for the first k docs (rest pending)
+        "history": [],  # [{"question", "answer"}]
+    }
+
+
+def load_session(session_id: Optional[str], scope: dict) -> dict:
+    """Fetch a live session bound to ``scope``, or start a fresh one.
+
+    Session IDs are always minted here — an unknown or expired ID from the
+    client gets a new one. A session only serves the report/patient scope it
+    was created with; any other scope (including none) starts a new session.
+    """
+    session = session_store.get(session_id) if session_id else None
+    if session is None:
+        return _new_session(scope)
+    if scope != session["scope"]:
+        logger.info(f"🔁 Session {session_id}: scope differs from the session's, starting a new session")
+        return _new_session(scope)
+    return session
+
+
+def save_session(session: dict):
+    session_store.set(session["session_id"], session)
+
+
+def _embed(embedder, texts: List[str]) -> np.ndarray:
+    # Session texts are one-off: keep them out of the persistent embedding tier
+    return normalize_rows(embedder.embed_array(texts, persist=False))
+
+
+def _merge_docs(session: dict, new_docs: List[Document]):
+    """Add documents not yet in the session; keep at most SESSION_MAX_DOCS.
+
+    Embedding is deferred to ``_embed_pending`` — a one-shot question never needs it.
+    """
+    known = {text for text, _ in session["docs"]}
+    fresh = [d for d in new_docs if d.page_content not in known]
+    if not fresh:
+        return
+    session["docs"] += [(d.page_content, d.metadata) for d in fresh]
+    # Oldest documents fall out first
+    dropped = max(0, len(session["docs"]) - SESSION_MAX_DOCS)
+    session["docs"] = session["docs"][dropped:]
+    if session["vectors"] is not None:
+        session["vectors"] = session["vectors"][dropped:]
+
+
+def _embed_pending(session: dict, embedder):
+    """Embed the session documents that do not have a vector yet."""
+    done = 0 if session["vectors"] is None else len(session["vectors"])
+    pending = [text for text, _ in session["docs"][done:]]
+    if pending:
+        vectors = _embed(embedder, pending)
+        session["vectors"] = vectors if not done else np.vstack([session["vectors"], vectors])
+
+
+def _rank_cached(session: dict, query_vector: np.ndarray, limit: int, exclude=()) -> List[Document]:
+    """Session documents most similar to the question, best first."""
+    scores = session["vectors"] @ query_vector
+    ranked = [i for i in np.argsort(-scores) if session["docs"][i][0] not in exclude]
+    return [Document(page_content=session["docs"][i][0], metadata=session["docs"][i][1]) for i in ranked[:limit]]
+
+
+def answer_in_session(question: str, session_id: Optional[str], scope: dict, retriever) -> dict:
+    """Answer a question using (and updating) the session's cached retrieval context."""
+    session = load_session(session_id, scope)
+    embedder = retriever.pdf.embedder
+    query_vector = None
+
+    # Step 1: Decide how much retrieval this turn needs (a first turn always retrieves)
+    route, new_entities = "full", set()
+    if session["docs"]:
+        _embed_pending(session, embedder)
+        query_vector = _embed(embedder, [question])[0]
+        known_terms = set()
+        for turn in session["history"]:
+            known_terms |= retriever.extract_entities(turn["question"])
+        route, new_entities = retriever.classify_followup(
+            question, query_vector, [text for text, _ in session["docs"]], session["vectors"],
+            known_terms, threshold=SESSION_SUFFICIENCY_THRESHOLD,
+        )
+    logger.info(f"🔁 Session {session['session_id']}: route={route}")
+
+    # Step 2: Retrieve only what is missing
+    retrieved = []
+    if route == "full":
+        retrieved = retriever.retrieve(question, **session["scope"])
+    elif route == "incremental":
+        retrieved = retriever.retrieve_incremental(question, new_entities, **session["scope"])
+    _merge_docs(session, retrieved)
+
+    if not session["docs"]:
+        save_session(session)
+        return {"response": None, "session_id": session["session_id"], "route": route}
+
+    # Step 3: Context — fresh results keep the retriever's (weighted) order; cached
+    # documents are ranked by similarity and only fill the remaining slots
+    if route == "full" and retrieved:
+        context_docs = retrieved
+    else:
+        _embed_pending(session, embedder)
+        if query_vector is None:
+            query_vector = _embed(embedder, [question])[0]
+        context_docs = retrieved[:SESSION_CONTEXT_DOCS]
+        context_docs += _rank_cached(session, query_vector, SESSION_CONTEXT_DOCS - len(context_docs),
+                                     exclude={d.page_content for d in context_docs})
+
+    # Step 4: Answer with compacted history
+    history = compact_history(session["history"])
+    response = query_chain(
+        get_conversation_chain(),
+        {"history": history, "context": format_docs(context_docs), "question": question},
+        cache_key=answer_cache_key(f"{history}\0{question}", context_docs),
+    )
+
+    session["history"].append({"question": question, "answer": response["response"][:MAX_STORED_ANSWER_CHARS]})
+    session["history"] = session["history"][-MAX_STORED_TURNS:]
+    save_session(session)
+    return {**response, "session_id": session["session_id"], "route": route}
@@ -0,0 +1,224 @@
+import fcntl
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.modules.local_vector_store import as_float32_matrix
+
+# ✅ Embedding model + cache settings
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+EMBEDDING_DISK_CACHE_ROWS = int(os.getenv("EMBEDDING_DISK_CACHE_ROWS", "200000"))  # ~300 MB at 384 dims
+
+
+def content_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+
+class MemmapEmbeddingStore:
+    """Persistent tier: float32 rows appended to one file and read back through np.memmap.
+
+    Safe to share between worker processes: appends hold an exclusive flock,
+    and rows written by other processes are picked up on the next miss. Line
+    ``n`` of the keys file names row ``n`` of the vectors file.
+
+    The tier holds at most ``max_rows`` vectors. An append that would exceed it
+    starts a new generation of files instead; the old files are unlinked, so
+    readers still mapping them are unaffected and move over on their next refresh.
+    """
+
+    def __init__(self, directory: str, dim: int, max_rows: int = EMBEDDING_DISK_CACHE_ROWS):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.max_rows = max_rows
+        self.lock_path = self.directory / f"store.{dim}.lock"
+        self.generation_path = self.directory / f"generation.{dim}"
+        self._lock = threading.Lock()
+        self._reset(self._read_generation())
+        self._refresh()
+
+    def _read_generation(self) -> int:
+        try:
+            return int(self.generation_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _reset(self, generation: int):
+        suffix = f".{generation}" if generation else ""
+        self.generation = generation
+        self.vectors_path = self.directory / f"vectors.{self.dim}{suffix}.f32"
+        self.keys_path = self.directory / f"keys.{self.dim}{suffix}.txt"
+        self._rows: Dict[str, int] = {}
+        self._indexed = 0  # key lines (= rows) indexed so far
+        self._keys_offset = 0
+        self._mmap = None
+
+    def _refresh(self):
+        """Index keys appended since the last refresh (by this or another process)."""
+        generation = self._read_generation()
+        if generation != self.generation:
+            self._reset(generation)
+        if not self.keys_path.exists() or self.keys_path.stat().st_size <= self._keys_offset:
+            return
+        # Never index a key whose row is not fully on disk yet
+        complete_rows = self.vectors_path.stat().st_size // (4 * self.dim) if self.vectors_path.exists() else 0
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            for line in f:
+                if not line.endswith(b"\n") or self._indexed >= complete_rows:
+                    break
+                self._rows.setdefault(line[:-1].decode(), self._indexed)
+                self._indexed += 1
+                self._keys_offset += len(line)
+
+    def _truncate_partial_append(self):
+        """Drop keys or rows written by an append that never completed (call under the flock).
+
+        Otherwise an orphan vector row would shift every later row off its key line.
+        """
+        row_bytes = 4 * self.dim
+        if self.keys_path.exists() and self.keys_path.stat().st_size > self._keys_offset:
+            os.truncate(self.keys_path, self._keys_offset)
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size > self._indexed * row_bytes:
+            os.truncate(self.vectors_path, self._indexed * row_bytes)
+
+    def _rotate(self):
+        """Start an empty generation (call under the flock)."""
+        old_paths = (self.vectors_path, self.keys_path)
+        tmp_path = self.generation_path.with_suffix(".tmp")
+        tmp_path.write_text(str(self.generation + 1))
+        os.replace(tmp_path, self.generation_path)
+        self._reset(self.generation + 1)
+        for path in old_paths:
+            path.unlink(missing_ok=True)
+
+    def _matrix(self):
+        if self._mmap is None or len(self._mmap) < self._indexed:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                   shape=(self._indexed, self.dim))
+        return self._mmap
+
+    def __len__(self) -> int:
+        return self._indexed
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            if any(key not in self._rows for key in keys):
+                self._refresh()
+            rows = {key: self._rows[key] for key in keys if key in self._rows}
+            if not rows:
+                return {}
+            matrix = self._matrix()
+            return {key: np.array(matrix[row]) for key, row in rows.items()}
+
+    def put_many(self, keys: List[str], vectors: np.ndarray) -> None:
+        with self._lock, open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._refresh()
+            self._truncate_partial_append()
+            new = [(key, vec) for key, vec in zip(keys, vectors) if key not in self._rows][-self.max_rows:]
+            if not new:
+                return
+            if self._indexed + len(new) > self.max_rows:
+                self._rotate()
+            with open(self.vectors_path, "ab") as f:
+                f.write(as_float32_matrix([vec for _, vec in new]).tobytes())
+            with open(self.keys_path, "a") as f:
+                f.writelines(f"{key}\n" for key, _ in new)
+            self._refresh()
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-hash keyed cache in front of an embedding model.
+
+    Lookups go in-memory LRU → memory-mapped disk tier → model; all misses of
+    one call are sent to the model as a single ``embed_documents`` batch.
+    """
+
+    def __init__(self, model: Embeddings, model_name: str, dim: int = EMBEDDING_DIM,
+                 cache_dir: str = EMBEDDING_CACHE_DIR, lru_size: int = EMBEDDING_CACHE_SIZE):
+        self.model = model
+        self.model_name = model_name
+        self.dim = dim
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.persistent = MemmapEmbeddingStore(Path(cache_dir) / model_name.replace("/", "__"), dim) if cache_dir else None
+        self.hits = 0
+        self.misses = 0
+
+    def _lru_get(self, key):
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+            return vector
+
+    def _lru_put(self, key, vector):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def embed_array(self, texts: List[str], persist: bool = True) -> np.ndarray:
+        """Embed texts into an (n, dim) float32 array, calling the model only for cache misses.
+
+        ``persist=False`` keeps throwaway texts (e.g. web passages) out of the disk tier.
+        """
+        keys = [content_key(self.model_name, text) for text in texts]
+        result = np.empty((len(texts), self.dim), dtype=np.float32)
+        missing: Dict[str, List[int]] = {}
+
+        for i, key in enumerate(keys):
+            vector = self._lru_get(key)
+            if vector is not None:
+                result[i] = vector
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing and persist and self.persistent is not None:
+            for key, vector in self.persistent.get_many(list(missing)).items():
+                result[missing.pop(key)] = vector
+                self._lru_put(key, vector)
+
+        self.misses += len(missing)
+        self.hits += len(texts) - sum(len(rows) for rows in missing.values())
+
+        if missing:
+            miss_keys = list(missing)
+            miss_texts = [texts[missing[key][0]] for key in miss_keys]
+            vectors = as_float32_matrix(self.model.embed_documents(miss_texts))
+            for key, vector in zip(miss_keys, vectors):
+                result[missing[key]] = vector
+                self._lru_put(key, vector)
+            if persist and self.persistent is not None:
+                self.persistent.put_many(miss_keys, vectors)
+
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        # Questions are mostly one-off; only the in-memory tier caches them
+        return self.embed_array([text], persist=False)[0].tolist()
+
+
+@lru_cache(maxsize=1)
+def get_embedder() -> CachedEmbeddings:
+    """Shared, cached MiniLM embedder — use this instead of building HuggingFaceEmbeddings directly."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    model = HuggingFaceEmbeddings(model_name=EMBED_MODEL_NAME)
+    return CachedEmbeddings(model, EMBED_MODEL_NAME)
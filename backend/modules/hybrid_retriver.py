@@ -1,10 +1,20 @@
 import os
 import re
 import requests
-from typing import List
+import numpy as np
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from langchain_core.documents import Document
-from langchain_community.tools import DuckDuckGoSearchResults
+from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from backend.modules.resilience import get_upstream, NCBI_API_KEY
+from backend.utils.ttl_cache import get_shared_cache
+from backend.utils.page_store import get_pages
 
 # ✅ Load .env file
 load_dotenv()
@@ -13,29 +23,75 @@ print(">>> [DEBUG] hybrid_retriever module loaded")
 # ====================================
 # 1️⃣ PubMed Retriever
 # ====================================
+PUBMED_CACHE_TTL = int(os.getenv("PUBMED_CACHE_TTL", "86400"))
+
+
 class PubMedRetriever:
     def __init__(self, max_results=5):
         self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
         self.max_results = max_results
+        self.upstream = get_upstream("pubmed")
+        self.cache = get_shared_cache("pubmed", maxsize=2048, ttl=PUBMED_CACHE_TTL)
+
+    def _get(self, url: str, max_wait: Optional[float] = None, **params):
+        if NCBI_API_KEY:
+            params["api_key"] = NCBI_API_KEY
+
+        def fetch():
+            # Inside the upstream call, so 429 / 5xx responses count as breaker failures
+            response = requests.get(url, params=params, timeout=self.upstream.timeout)
+            response.raise_for_status()
+            return response
+
+        return self.upstream.call(fetch, max_wait=max_wait)
 
-    def retrieve(self, query: str) -> List[Document]:
-        """Fetch abstracts from PubMed for medical context."""
+    @staticmethod
+    def _parse_abstracts(xml_text: str) -> Dict[str, str]:
+        """Map PMID → "title + abstract" from an efetch XML response covering many articles."""
+        abstracts = {}
+        for article in ET.fromstring(xml_text).iter("PubmedArticle"):
+            pmid = article.findtext("MedlineCitation/PMID", default="").strip()
+            title_node = article.find("MedlineCitation/Article/ArticleTitle")
+            title = "".join(title_node.itertext()).strip() if title_node is not None else ""
+            sections = []
+            for part in article.iterfind("MedlineCitation/Article/Abstract/AbstractText"):
+                text = "".join(part.itertext()).strip()
+                label = part.get("Label")
+                if text:
+                    sections.append(f"{label}: {text}" if label else text)
+            content = "\n\n".join(filter(None, [title, "\n".join(sections)]))
+            if pmid and content:
+                abstracts[pmid] = content
+        return abstracts
+
+    def retrieve(self, query: str, max_wait: Optional[float] = None) -> List[Document]:
+        """Fetch abstracts from PubMed for medical context.
+
+        ``max_wait`` overrides how long to queue for a rate-limit token (batch callers wait longer).
+        """
+        cache_key = " ".join(query.split()).lower()
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return [Document(page_content=text, metadata=dict(metadata)) for text, metadata in cached]
         try:
-            search_url = f"{self.base_url}esearch.fcgi?db=pubmed&term={query}&retmax={self.max_results}&retmode=json"
-            search_res = requests.get(search_url).json()
+            search_res = self._get(f"{self.base_url}esearch.fcgi", max_wait, db="pubmed", term=query,
+                                   retmax=self.max_results, retmode="json").json()
             ids = search_res.get("esearchresult", {}).get("idlist", [])
 
             docs = []
-            for pmid in ids:
-                fetch_url = f"{self.base_url}efetch.fcgi?db=pubmed&id={pmid}&retmode=text&rettype=abstract"
-                abstract_text = requests.get(fetch_url).text.strip()
-                if abstract_text:
-                    docs.append(
-                        Document(
-                            page_content=abstract_text,
-                            metadata={"source": f"PubMed PMID:{pmid}", "weight": 1.0}
+            if ids:
+                # One efetch for all IDs: two NCBI requests per query instead of 1 + N
+                abstracts = self._parse_abstracts(self._get(f"{self.base_url}efetch.fcgi", max_wait, db="pubmed",
+                                                            id=",".join(ids), retmode="xml").text)
+                for pmid in ids:
+                    if pmid in abstracts:
+                        docs.append(
+                            Document(
+                                page_content=abstracts[pmid],
+                                metadata={"source": f"PubMed PMID:{pmid}", "weight": 1.0}
+                            )
                         )
-                    )
+            self.cache.set(cache_key, [(d.page_content, d.metadata) for d in docs])
             return docs
         except Exception as e:
             print(f"❌ [PubMedRetriever] Error: {e}")
@@ -44,37 +100,167 @@ class PubMedRetriever:
 # ====================================
 # 2️⃣ Trusted Web Retriever (DuckDuckGo)
 # ====================================
+WEB_PAGE_CACHE_TTL = int(os.getenv("WEB_PAGE_CACHE_TTL", "86400"))
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+MAX_CHUNKS_PER_PAGE = int(os.getenv("WEB_MAX_CHUNKS_PER_PAGE", "8"))
+
+
+class _PageTextExtractor(HTMLParser):
+    """Collect visible text from an HTML page, skipping scripts, styles and navigation."""
+    SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "svg"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth and data.strip():
+            self.parts.append(data.strip())
+
+    def text(self) -> str:
+        return "\n".join(self.parts)
+
+
 class TrustedWebRetriever:
-    def __init__(self, max_results=5):
-        self.search = DuckDuckGoSearchResults(max_results=max_results)
-        self.trusted_domains = [
-            "pubmed.ncbi.nlm.nih.gov", "www.who.int", "www.cdc.gov", "www.nih.gov",
-            "jamanetwork.com", "www.thelancet.com", "www.mayoclinic.org", "medlineplus.gov"
-        ]
+    def __init__(self, max_results=5, embedder=None, max_passages=4, max_chunks_per_page=MAX_CHUNKS_PER_PAGE):
+        self.search = DuckDuckGoSearchAPIWrapper(max_results=max_results)
+        self.max_results = max_results
+        self.embedder = embedder
+        self.max_passages = max_passages
+        self.max_chunks_per_page = max_chunks_per_page
+        self.upstream = get_upstream("duckduckgo")
+        self.page_upstream = get_upstream("web")
+        self.page_cache = get_shared_cache("web_pages", maxsize=512, ttl=WEB_PAGE_CACHE_TTL)
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
+        self.trusted_domains = {
+            "pubmed.ncbi.nlm.nih.gov", "who.int", "cdc.gov", "nih.gov",
+            "jamanetwork.com", "thelancet.com", "mayoclinic.org", "medlineplus.gov"
+        }
 
-    def retrieve(self, query: str) -> List[Document]:
-        """Retrieve results only from trusted health domains."""
+    def _trusted_host(self, url: str) -> Optional[str]:
+        """Return the hostname if it (or a parent domain) is trusted, else None."""
+        host = (urlparse(url).hostname or "").lower()
+        labels = host.split(".")
+        for i in range(len(labels) - 1):
+            if ".".join(labels[i:]) in self.trusted_domains:
+                return host
+        return None
+
+    def _fetch_page_text(self, url: str, max_wait: Optional[float] = None) -> str:
+        cached = self.page_cache.get(url)
+        if cached is not None:
+            return cached
+
+        def fetch():
+            with requests.get(url, timeout=self.page_upstream.timeout, stream=True,
+                              headers={"User-Agent": "Mozilla/5.0 (HealthcareAssistant)"}) as response:
+                response.raise_for_status()
+                # Redirects are followed; the final page must still be on a trusted domain
+                if not self._trusted_host(response.url):
+                    raise ValueError(f"redirected to untrusted host: {response.url}")
+                if "html" not in response.headers.get("Content-Type", ""):
+                    return ""
+                body = bytearray()
+                for block in response.iter_content(64 * 1024):
+                    body += block
+                    if len(body) >= MAX_PAGE_BYTES:
+                        break
+                return bytes(body).decode(response.encoding or "utf-8", errors="ignore")
+
+        parser = _PageTextExtractor()
+        parser.feed(self.page_upstream.call(fetch, max_wait=max_wait))
+        text = parser.text()
+        self.page_cache.set(url, text)
+        return text
+
+    def _passages(self, hit: dict, max_wait: Optional[float] = None) -> List[Document]:
+        """Chunk the start of a trusted page into passages; fall back to the search snippet if it can't be fetched."""
+        metadata = {"source": f"Web ({hit['host']})", "url": hit["link"], "title": hit.get("title", ""), "weight": 0.6}
         try:
-            results_text = self.search.run(query)
-            docs = []
-            for domain in self.trusted_domains:
-                if domain in results_text:
-                    docs.append(
-                        Document(
-                            page_content=results_text,
-                            metadata={"source": f"Web ({domain})", "weight": 0.6}
-                        )
-                    )
+            text = self._fetch_page_text(hit["link"], max_wait)
+        except Exception as e:
+            print(f"❌ [TrustedWebRetriever] Fetch failed for {hit['link']}: {e}")
+            text = ""
+        # Lead sections carry the summary; long pages would otherwise flood the ranking step
+        chunks = self.splitter.split_text(text)[:self.max_chunks_per_page] if text else []
+        if not chunks and hit.get("snippet"):
+            chunks = [hit["snippet"]]
+        return [Document(page_content=chunk, metadata=dict(metadata)) for chunk in chunks]
+
+    def _rank(self, query: str, passages: List[Document]) -> List[Document]:
+        if self.embedder is None or len(passages) <= self.max_passages:
+            return passages[:self.max_passages]
+        vectors = self.embedder.embed_array([query] + [p.page_content for p in passages], persist=False)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scores = vectors[1:] @ vectors[0]
+        best = np.argsort(-scores)[:self.max_passages]
+        for i in best:
+            passages[i].metadata["score"] = float(scores[i])
+        return [passages[i] for i in best]
+
+    def retrieve(self, query: str, max_wait: Optional[float] = None) -> List[Document]:
+        """Retrieve the best-matching passages from trusted health pages in the search results."""
+        try:
+            results = self.upstream.call(self.search.results, query, self.max_results,
+                                         hard_timeout=True, max_wait=max_wait)
+
+            hits, seen_urls = [], set()
+            for result in results:
+                link = result.get("link", "")
+                host = self._trusted_host(link)
+                if host and link not in seen_urls:
+                    seen_urls.add(link)
+                    hits.append({**result, "host": host})
+            if not hits:
+                return []
+
+            with ThreadPoolExecutor(max_workers=len(hits)) as pool:
+                passages = [p for page in pool.map(partial(self._passages, max_wait=max_wait), hits) for p in page]
+
+            docs = self._rank(query, passages)
+            print(f">>> [DEBUG] Web: {len(hits)} trusted pages → {len(docs)} passages.")
             return docs
         except Exception as e:
             print(f"❌ [TrustedWebRetriever] Error: {e}")
             return []
 
+# ====================================
+# 🎯 Query scope (which reports a question may search)
+# ====================================
+def build_query_scope(report_id: Optional[str] = None,
+                      patient_id: Optional[str] = None,
+                      filenames: Optional[List[str]] = None) -> dict:
+    """Translate report/patient/filename selectors into a Pinecone namespace + metadata filter.
+
+    Patients get their own namespace at upload time; report IDs and filenames
+    are matched against the chunk metadata written by ``load_vectorstore``.
+    Without ``patient_id`` only the default namespace is searched — callers
+    resolve it from the report log first (see ``resolve_query_scope``).
+    """
+    metadata_filter = {}
+    if report_id:
+        metadata_filter["report_id"] = {"$eq": report_id}
+    if filenames:
+        metadata_filter["filename"] = {"$in": list(filenames)}
+    return {
+        "namespace": patient_id or None,
+        "metadata_filter": metadata_filter or None,
+    }
+
 # ====================================
 # 3️⃣ PDF Retriever (Pinecone v3 Compatible)
 # ====================================
 class PDFPineconeRetriever:
-    def __init__(self, index_name: str, embedder):
+    def __init__(self, index_name: str, embedder, top_k: int = 5, child_top_k: int = 20):
         from pinecone import Pinecone
 
         # ✅ Hard-code API key for debugging (temporary!)
@@ -91,54 +277,121 @@ class PDFPineconeRetriever:
 
         self.index = self.pc.Index(index_name)
         self.embedder = embedder
+        self.top_k = top_k  # parent pages returned
+        self.child_top_k = child_top_k  # child chunks matched in Pinecone
+        self.upstream = get_upstream("pinecone")
 
-    def retrieve(self, query: str) -> List[Document]:
-        """Query Pinecone for uploaded PDF document chunks."""
+    def retrieve(self, query: str, namespace: Optional[str] = None,
+                 metadata_filter: Optional[dict] = None) -> List[Document]:
+        """Query Pinecone for uploaded PDF document chunks, optionally scoped to a namespace/filter."""
         try:
             query_vector = self.embedder.embed_query(query)
-            response = self.index.query(
-                vector=query_vector,
-                top_k=5,
-                include_metadata=True
-            )
-
-            # ✅ Handle both dict/object formats
-            matches = []
-            if isinstance(response, dict):
-                matches = response.get("matches", [])
-            elif hasattr(response, "matches"):
-                matches = response.matches
+            return self._query_vector(query_vector, namespace, metadata_filter)
+        except Exception as e:
+            print(f"❌ [PDFPineconeRetriever] Error: {e}")
+            return []
 
-            docs = []
-            for match in matches:
-                metadata = getattr(match, "metadata", None) or match.get("metadata", {})
-                content = metadata.get("text", "")
-                if content:
-                    docs.append(
-                        Document(
-                            page_content=content,
-                            metadata={
-                                **metadata,
-                                "score": getattr(match, "score", 0.0),
-                                "source": "Uploaded PDF",
-                                "weight": 0.9
-                            }
-                        )
-                    )
+    def retrieve_many(self, queries: List[str], max_workers: int = 8, namespace: Optional[str] = None,
+                      metadata_filter: Optional[dict] = None, max_wait: Optional[float] = None) -> List[List[Document]]:
+        """Embed all queries in one batch and run the Pinecone queries concurrently."""
+        if not queries:
+            return []
+        try:
+            query_vectors = self.embedder.embed_array(queries, persist=False).tolist()
+        except Exception as e:
+            print(f"❌ [PDFPineconeRetriever] Batch embedding error: {e}")
+            return [[] for _ in queries]
 
-            print(f">>> [DEBUG] Pinecone returned {len(docs)} matching chunks.")
-            return docs
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as pool:
+            return list(pool.map(
+                lambda vector: self._safe_query_vector(vector, namespace, metadata_filter, max_wait),
+                query_vectors
+            ))
+
+    def _safe_query_vector(self, query_vector, namespace=None, metadata_filter=None, max_wait=None) -> List[Document]:
+        try:
+            return self._query_vector(query_vector, namespace, metadata_filter, max_wait)
         except Exception as e:
             print(f"❌ [PDFPineconeRetriever] Error: {e}")
             return []
 
+    def _query_vector(self, query_vector, namespace=None, metadata_filter=None, max_wait=None) -> List[Document]:
+        query_kwargs = {}
+        if namespace:
+            query_kwargs["namespace"] = namespace
+        if metadata_filter:
+            query_kwargs["filter"] = metadata_filter
+
+        response = self.upstream.call(
+            self.index.query,
+            hard_timeout=True,
+            max_wait=max_wait,
+            vector=query_vector,
+            top_k=self.child_top_k,
+            include_metadata=True,
+            **query_kwargs
+        )
+
+        # ✅ Handle both dict/object formats
+        matches = []
+        if isinstance(response, dict):
+            matches = response.get("matches", [])
+        elif hasattr(response, "matches"):
+            matches = response.matches
+
+        # ✅ Group child hits by parent page; each parent is returned once, best score first
+        parents: Dict[str, dict] = {}
+        docs = []
+        for match in matches:
+            if isinstance(match, dict):
+                metadata, score = match.get("metadata") or {}, match.get("score", 0.0)
+            else:
+                metadata, score = match.metadata or {}, getattr(match, "score", 0.0)
+
+            parent_id = metadata.get("parent_id")
+            if parent_id:
+                group = parents.setdefault(parent_id, {"metadata": metadata, "score": score, "children": 0})
+                group["score"] = max(group["score"], score)
+                group["children"] += 1
+            elif metadata.get("text") and len(docs) < self.top_k:
+                # Chunks ingested before parent pages existed still carry their own text
+                docs.append(self._pdf_document(metadata["text"], metadata, score))
+
+        best_parents = sorted(parents, key=lambda pid: parents[pid]["score"], reverse=True)[:self.top_k]
+        page_texts = get_pages(best_parents)
+        for parent_id in best_parents:
+            if parent_id in page_texts:
+                group = parents[parent_id]
+                docs.append(self._pdf_document(
+                    page_texts[parent_id], group["metadata"], group["score"], matched_chunks=group["children"]
+                ))
+
+        # Legacy chunks and parent pages compete for the same top_k slots
+        docs.sort(key=lambda d: d.metadata["score"], reverse=True)
+        docs = docs[:self.top_k]
+        print(f">>> [DEBUG] Pinecone returned {len(matches)} chunks → {len(docs)} page contexts.")
+        return docs
+
+    @staticmethod
+    def _pdf_document(text: str, metadata: dict, score: float, **extra) -> Document:
+        return Document(
+            page_content=text,
+            metadata={
+                **{k: v for k, v in metadata.items() if k != "text"},
+                **extra,
+                "score": score,
+                "source": "Uploaded PDF",
+                "weight": 0.9
+            }
+        )
+
 # ====================================
 # 4️⃣ Hybrid Retriever (Intelligent Orchestrator)
 # ====================================
 class HybridRetriever:
     def __init__(self, index_name: str, embedder):
         self.pubmed = PubMedRetriever()
-        self.web = TrustedWebRetriever()
+        self.web = TrustedWebRetriever(embedder=embedder)
         self.pdf = PDFPineconeRetriever(index_name=index_name, embedder=embedder)
 
         # 🩺 Keywords that indicate patient-specific/lab queries
@@ -154,19 +407,87 @@ class HybridRetriever:
         pattern = "|".join(self.lab_keywords)
         return bool(re.search(pattern, query.lower()))
 
-    def retrieve(self, query: str) -> List[Document]:
+    # 🔁 Lab analytes, conditions and drug classes that count as entities in a follow-up question
+    MEDICAL_TERMS = {
+        # lipids / metabolic
+        "cholesterol", "ldl", "hdl", "vldl", "triglycerides", "triglyceride", "lipoprotein", "glucose",
+        "hba1c", "a1c", "insulin", "c-peptide", "ketones", "lactate",
+        # blood count
+        "hemoglobin", "haemoglobin", "hematocrit", "rbc", "wbc", "platelets", "platelet", "mcv", "mch",
+        "mchc", "rdw", "neutrophils", "lymphocytes", "monocytes", "eosinophils", "basophils", "esr",
+        # kidney / electrolytes
+        "creatinine", "egfr", "bun", "urea", "uric", "sodium", "potassium", "chloride", "bicarbonate",
+        "calcium", "magnesium", "phosphorus", "phosphate", "albuminuria", "microalbumin", "urine",
+        # liver / proteins
+        "alt", "ast", "alp", "ggt", "bilirubin", "albumin", "globulin", "protein", "ammonia", "ldh",
+        # thyroid / hormones
+        "tsh", "t3", "t4", "ft3", "ft4", "cortisol", "testosterone", "estrogen", "estradiol",
+        "progesterone", "prolactin", "lh", "fsh", "pth",
+        # iron / vitamins
+        "iron", "ferritin", "transferrin", "tibc", "b12", "folate", "vitamin", "vitamin-d",
+        # inflammation / cardiac / coagulation
+        "crp", "hs-crp", "troponin", "bnp", "d-dimer", "inr", "ptt", "fibrinogen", "homocysteine", "psa",
+        # conditions
+        "anemia", "anaemia", "diabetes", "prediabetes", "hypertension", "hypothyroidism",
+        "hyperthyroidism", "hyperlipidemia", "dyslipidemia", "cancer", "infection", "kidney", "liver",
+        "thyroid", "heart", "gout", "obesity", "fatty",
+        # treatments
+        "statin", "statins", "metformin", "levothyroxine", "aspirin", "supplements", "supplement",
+    }
+
+    def extract_entities(self, text: str) -> set:
+        """Medical terms mentioned in ``text`` (plain words like "worried" are not entities)."""
+        return {
+            term for term in re.findall(r"[a-z0-9][a-z0-9\-]{1,}", text.lower())
+            if term in self.MEDICAL_TERMS
+        }
+
+    def classify_followup(self, query: str, query_vector, cached_texts: List[str], cached_vectors,
+                          known_terms: set, threshold: float = 0.35):
+        """Route a follow-up question: "cached", "incremental" (new entities only) or "full".
+
+        ``query_vector`` and ``cached_vectors`` must be unit-normalized.
+        """
+        if not cached_texts:
+            return "full", set()
+        # Whole-term comparison: a substring test would find "alt" in "health" or "ldl" in "vldl"
+        covered = self.extract_entities("\n".join(cached_texts)) | known_terms
+        new_entities = self.extract_entities(query) - covered
+        best_similarity = float(np.max(np.asarray(cached_vectors) @ np.asarray(query_vector)))
+
+        if not new_entities and best_similarity >= threshold:
+            return "cached", set()
+        if new_entities:
+            return "incremental", new_entities
+        return "full", set()
+
+    def retrieve_incremental(self, query: str, new_entities: set, namespace: Optional[str] = None,
+                             metadata_filter: Optional[dict] = None) -> List[Document]:
+        """Fetch only what a follow-up adds: report pages for the question, PubMed for the new terms."""
+        try:
+            entity_query = " ".join(sorted(new_entities))
+            print(f">>> [DEBUG] Incremental retrieval for new entities: {entity_query}")
+            all_docs = self.pdf.retrieve(query, namespace, metadata_filter) + self.pubmed.retrieve(entity_query)
+            all_docs.sort(key=lambda d: d.metadata.get("weight", 0), reverse=True)
+            return all_docs
+        except Exception as e:
+            print(f"❌ [HybridRetriever] Incremental error: {e}")
+            return []
+
+    def retrieve(self, query: str, namespace: Optional[str] = None,
+                 metadata_filter: Optional[dict] = None) -> List[Document]:
         """Hybrid retrieval: intelligently decide source based on query type."""
         try:
             if self._is_patient_query(query):
                 print(">>> [DEBUG] Detected patient-specific query → prioritizing PDF (lab reports).")
-                pdf_docs = self.pdf.retrieve(query)
+                pdf_docs = self.pdf.retrieve(query, namespace, metadata_filter)
                 pubmed_docs = self.pubmed.retrieve(query)
                 all_docs = pdf_docs + pubmed_docs
             else:
                 print(">>> [DEBUG] General medical query → using PubMed + Web + PDF.")
                 pubmed_docs = self.pubmed.retrieve(query)
                 web_docs = self.web.retrieve(query)
-                pdf_docs = self.pdf.retrieve(query)
+                pdf_docs = self.pdf.retrieve(query, namespace, metadata_filter)
                 all_docs = pubmed_docs + pdf_docs + web_docs
 
             # ✅ Weighted sorting
@@ -177,3 +498,59 @@ class HybridRetriever:
         except Exception as e:
             print(f"❌ [HybridRetriever] Error: {e}")
             return []
+
+    def retrieve_many(self, queries: List[str], max_workers: int = 8, namespace: Optional[str] = None,
+                      metadata_filter: Optional[dict] = None, max_wait: Optional[float] = None) -> List[List[Document]]:
+        """Batch hybrid retrieval: one embedding call, concurrent lookups, shared external results.
+
+        Pass a generous ``max_wait`` so lookups queue for rate-limit tokens instead of
+        being refused (a refused lookup silently drops that source's context).
+        """
+        try:
+            pdf_results = self.pdf.retrieve_many(queries, max_workers=max_workers, namespace=namespace,
+                                                 metadata_filter=metadata_filter, max_wait=max_wait)
+
+            # ✅ PubMed / Web are fetched once per distinct question, then shared
+            keys = [self._normalize(q) for q in queries]
+            patient = [self._is_patient_query(q) for q in queries]
+            pubmed_keys = list(dict.fromkeys(keys))
+            web_keys = list(dict.fromkeys(k for k, p in zip(keys, patient) if not p))
+
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                pubmed_futures = {k: pool.submit(self.pubmed.retrieve, k, max_wait) for k in pubmed_keys}
+                web_futures = {k: pool.submit(self.web.retrieve, k, max_wait) for k in web_keys}
+                pubmed_map: Dict[str, List[Document]] = {k: f.result() for k, f in pubmed_futures.items()}
+                web_map: Dict[str, List[Document]] = {k: f.result() for k, f in web_futures.items()}
+
+            results = []
+            for key, is_patient, pdf_docs in zip(keys, patient, pdf_results):
+                if is_patient:
+                    all_docs = pdf_docs + pubmed_map[key]
+                else:
+                    all_docs = pubmed_map[key] + pdf_docs + web_map[key]
+                all_docs = self._dedupe(all_docs)
+                all_docs.sort(key=lambda d: d.metadata.get("weight", 0), reverse=True)
+                results.append(all_docs)
+
+            print(f">>> [DEBUG] Batch retrieval: {len(queries)} questions, "
+                  f"{len(pubmed_keys)} PubMed lookups, {len(web_keys)} web lookups.")
+            return results
+        except Exception as e:
+            print(f"❌ [HybridRetriever] Batch error: {e}")
+            return [[] for _ in queries]
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.split()).lower()
+
+    @staticmethod
+    def _dedupe(docs: List[Document]) -> List[Document]:
+        """Drop documents whose text was already seen (e.g. the same abstract from two lookups)."""
+        seen = set()
+        unique = []
+        for doc in docs:
+            if doc.page_content in seen:
+                continue
+            seen.add(doc.page_content)
+            unique.append(doc)
+        return unique
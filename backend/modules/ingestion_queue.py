@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+
+# ✅ "inline": API worker embeds the upload itself (single process)
+#    "queue":  API workers enqueue jobs for the single ingestion worker (multi-worker mode)
+INGESTION_MODE = os.getenv("INGESTION_MODE", "inline")
+INGESTION_QUEUE_PATH = os.getenv("INGESTION_QUEUE_PATH", "./ingestion_jobs.sqlite3")
+
+
+def _connect():
+    conn = sqlite3.connect(INGESTION_QUEUE_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS jobs (
+               job_id     TEXT PRIMARY KEY,
+               status     TEXT NOT NULL,
+               payload    TEXT NOT NULL,
+               result     TEXT,
+               error      TEXT,
+               created_at REAL NOT NULL,
+               updated_at REAL NOT NULL
+           )"""
+    )
+    return conn
+
+
+def submit_ingestion(file_paths, doc_type="lab_report", patient_id=None, filenames=None) -> str:
+    """Queue files (already saved on disk) for embedding; returns the job ID."""
+    job_id = uuid.uuid4().hex
+    payload = json.dumps({"file_paths": list(file_paths), "doc_type": doc_type, "patient_id": patient_id,
+                          "filenames": list(filenames) if filenames else None})
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT INTO jobs (job_id, status, payload, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+            (job_id, payload, now, now),
+        )
+    return job_id
+
+
+def get_job(job_id: str):
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT job_id, status, result, error, created_at, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    return {
+        "job_id": row[0],
+        "status": row[1],
+        "result": json.loads(row[2]) if row[2] else None,
+        "error": row[3],
+        "created_at": row[4],
+        "updated_at": row[5],
+    }
+
+
+def _claim_next_job(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT job_id, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE job_id = ?", (time.time(), row[0])
+            )
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _finish_job(conn, job_id, status, result=None, error=None):
+    conn.execute(
+        "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?",
+        (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+    )
+
+
+def run_ingestion_worker(poll_interval: float = 1.0, stop_event=None):
+    """Process queued uploads one at a time until ``stop_event`` is set."""
+    from backend.logger import logger
+    from backend.modules.load_vectorstore import load_vectorstore
+    from backend.utils.report_store import save_report_metadata
+
+    logger.info(f"📥 Ingestion worker started (pid {os.getpid()})")
+    with closing(_connect()) as conn:
+        # Jobs left 'running' by a crashed worker are retried
+        conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+
+        while stop_event is None or not stop_event.is_set():
+            try:
+                job = _claim_next_job(conn)
+            except sqlite3.Error:
+                # e.g. "database is locked" under heavy contention — the queue is still there, retry
+                logger.exception("⚠️ Could not claim an ingestion job, retrying")
+                time.sleep(poll_interval)
+                continue
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+
+            job_id, payload = job[0], json.loads(job[1])
+            try:
+                result = load_vectorstore(payload["file_paths"], doc_type=payload["doc_type"],
+                                          patient_id=payload["patient_id"], filenames=payload.get("filenames"))
+                for record in result["uploaded_files"]:
+                    save_report_metadata(record["file"], record["chunks"], record["report_id"], record["patient_id"])
+                _finish_job(conn, job_id, "done", result=result)
+                logger.info(f"✅ Ingestion job {job_id} done")
+            except Exception as e:
+                logger.exception(f"❌ Ingestion job {job_id} failed")
+                try:
+                    _finish_job(conn, job_id, "failed", error=str(e))
+                except sqlite3.Error:
+                    # Left 'running'; requeued the next time the worker starts
+                    logger.exception(f"⚠️ Could not mark ingestion job {job_id} as failed")
+
+
+if __name__ == "__main__":
+    run_ingestion_worker()
@@ -1,28 +1,32 @@
 import os
+from functools import lru_cache, partial
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda
+from backend.modules.resilience import get_upstream, LLM_TIMEOUT
 
 # ✅ Load environment variables
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_MODEL_NAME = "meta-llama/llama-4-scout-17b-16e-instruct"
 
+# ---------------------------
+# 🧩 Create Prompt
+# ---------------------------
+ANSWER_INSTRUCTIONS = """
+---
+💬 **Answer:**
+- Respond in a calm, factual, and respectful tone.
+- Use simple explanations when needed.
+- If the context does not contain the answer, say: "I'm sorry, but I couldn't find relevant information in the provided documents."
+- Do NOT make up facts or provide information not present in the context.
+- Keep your answers concise and to the point.
+- Act like a professional medical assistant.                                                                                        
+"""
 
-def get_llm_chain(retriever):
-    # ---------------------------
-    # 🧠 Initialize Groq LLM
-    # ---------------------------
-    llm = ChatGroq(
-        groq_api_key=GROQ_API_KEY,
-        model_name="meta-llama/llama-4-scout-17b-16e-instruct"
-    )
-
-    # ---------------------------
-    # 🧩 Create Prompt
-    # ---------------------------
-    prompt = ChatPromptTemplate.from_template("""
+prompt = ChatPromptTemplate.from_template("""
 You are  an AI-powered assistant trained to help users understand medical documents and health-related questions.
 
 Your job is to provide clear, accurate, and helpful responses based **only on the provided context**.
@@ -33,28 +37,60 @@ Your job is to provide clear, accurate, and helpful responses based **only on th
 
 🙋‍♂️ **User Question:**
 {question}
+""" + ANSWER_INSTRUCTIONS)
+
+# 🔁 Same prompt with the earlier turns of the conversation, for follow-up questions
+conversation_prompt = ChatPromptTemplate.from_template("""
+You are  an AI-powered assistant trained to help users understand medical documents and health-related questions.
+
+Your job is to provide clear, accurate, and helpful responses based **only on the provided context**.
+Use the conversation so far to understand what the user is referring to.
 
 ---
-💬 **Answer:**
-- Respond in a calm, factual, and respectful tone.
-- Use simple explanations when needed.
-- If the context does not contain the answer, say: "I'm sorry, but I couldn't find relevant information in the provided documents."
-- Do NOT make up facts or provide information not present in the context.
-- Keep your answers concise and to the point.
-- Act like a professional medical assistant.                                                                                        
-""")
+🗂️ **Conversation so far:**
+{history}
+
+---
+🔍 **Context:**
+{context}
+
+🙋‍♂️ **User Question:**
+{question}
+""" + ANSWER_INSTRUCTIONS)
 
+
+def format_docs(docs):
+    """Join retrieved documents into a single context string for the prompt."""
+    return "\n\n".join([d.page_content for d in docs])
+
+
+@lru_cache(maxsize=1)
+def get_llm():
     # ---------------------------
-    # ⚙️ LCEL Chain (new version)
+    # 🧠 Initialize Groq LLM (once per process)
     # ---------------------------
-    chain = (
-        {
-            "context": retriever | (lambda docs: "\n\n".join([d.page_content for d in docs])),
-            "question": RunnablePassthrough(),
-        }
-        | prompt
-        | llm
-        | StrOutputParser()
+    return ChatGroq(
+        groq_api_key=GROQ_API_KEY,
+        model_name=GROQ_MODEL_NAME,
+        timeout=LLM_TIMEOUT,
+        max_retries=1
     )
 
-    return chain
+
+def _invoke_llm(messages, max_wait=None):
+    # 🛡️ Rate limit, circuit breaker and bounded queue shared by every Groq call
+    return get_upstream("groq").call(get_llm().invoke, messages, max_wait=max_wait)
+
+
+def get_answer_chain(max_wait=None):
+    """Chain that expects {"context": str, "question": str} — used when retrieval is done up front.
+
+    ``max_wait`` is how long a call may queue for a free LLM slot before
+    UpstreamSaturatedError is raised (defaults to the upstream's setting).
+    """
+    return prompt | RunnableLambda(partial(_invoke_llm, max_wait=max_wait)) | StrOutputParser()
+
+
+def get_conversation_chain():
+    """Chain that expects {"history": str, "context": str, "question": str}."""
+    return conversation_prompt | RunnableLambda(_invoke_llm) | StrOutputParser()
@@ -1,12 +1,17 @@
 import os
 import time
+import uuid
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 from dotenv import load_dotenv
 from tqdm.auto import tqdm
 from pinecone import Pinecone, ServerlessSpec
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from backend.modules.embedding_cache import get_embedder, EMBEDDING_DIM
+from backend.modules.local_vector_store import get_local_vector_store
+from backend.utils.page_store import parent_id_for, save_page
 
 # ✅ Load environment variables
 load_dotenv()
@@ -19,88 +24,133 @@ PINECONE_INDEX_NAME = "medicalassistantindex"
 if not PINECONE_API_KEY:
     raise ValueError("❌ Pinecone API key not found! Check your .env or environment variables.")
 
-# ✅ Initialize Pinecone only once
-pc = Pinecone(api_key="PINECONE_API_KEY ")
-print(f"✅ Pinecone initialized successfully")
-
 UPLOAD_DIR = "./uploaded_docs"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+CHILD_CHUNK_SIZE = int(os.getenv("CHILD_CHUNK_SIZE", "200"))
+CHILD_CHUNK_OVERLAP = int(os.getenv("CHILD_CHUNK_OVERLAP", "20"))
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-spec = ServerlessSpec(cloud="aws", region=PINECONE_ENV)
-existing_indexes = [i["name"] for i in pc.list_indexes()]
+# ✅ Local embedding model (shared, with embedding cache) — loaded at import so
+# a preloading server (gunicorn --preload) shares it copy-on-write with workers
+embed_model = get_embedder()
+embedding_dim = EMBEDDING_DIM  # model outputs 384-dim embeddings
+
+
+# ✅ Pinecone is initialized lazily, once per process: its HTTP connection pool
+# must not be created before the server forks its workers
+@lru_cache(maxsize=1)
+def get_index():
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    print(f"✅ Pinecone initialized successfully")
 
-# ✅ Local embedding model
-embed_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-embedding_dim = 384  # model outputs 384-dim embeddings
+    existing_indexes = [i["name"] for i in pc.list_indexes()]
 
-# ✅ Create Pinecone index if not exists
-if PINECONE_INDEX_NAME not in existing_indexes:
-    print(f"🧠 Creating Pinecone index: {PINECONE_INDEX_NAME}")
-    pc.create_index(
-        name=PINECONE_INDEX_NAME,
-        dimension=embedding_dim,
-        metric="cosine",
-        spec=spec
-    )
-    while not pc.describe_index(PINECONE_INDEX_NAME).status["ready"]:
-        print("⏳ Waiting for index to be ready...")
-        time.sleep(2)
+    # ✅ Create Pinecone index if not exists
+    if PINECONE_INDEX_NAME not in existing_indexes:
+        print(f"🧠 Creating Pinecone index: {PINECONE_INDEX_NAME}")
+        pc.create_index(
+            name=PINECONE_INDEX_NAME,
+            dimension=embedding_dim,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region=PINECONE_ENV)
+        )
+        while not pc.describe_index(PINECONE_INDEX_NAME).status["ready"]:
+            print("⏳ Waiting for index to be ready...")
+            time.sleep(2)
 
-index = pc.Index(PINECONE_INDEX_NAME)
+    return pc.Index(PINECONE_INDEX_NAME)
 
 # ✅ Utility: Batch upsert for large files
-def batch_upsert(index, ids, embeddings, metadatas, batch_size=100):
+def batch_upsert(index, ids, embeddings, metadatas, batch_size=100, namespace=None):
+    upsert_kwargs = {"namespace": namespace} if namespace else {}
     for i in range(0, len(ids), batch_size):
         batch_ids = ids[i:i + batch_size]
-        batch_emb = embeddings[i:i + batch_size]
+        batch_emb = embeddings[i:i + batch_size].tolist()  # only one batch as Python lists at a time
         batch_meta = metadatas[i:i + batch_size]
-        index.upsert(vectors=zip(batch_ids, batch_emb, batch_meta))
+        index.upsert(vectors=list(zip(batch_ids, batch_emb, batch_meta)), **upsert_kwargs)
 
-# ✅ Main function to embed and upload
-def load_vectorstore(uploaded_files, doc_type="lab_report"):
-    file_paths = []
-    summary = []
+# ✅ Streaming helpers: pages → chunks → fixed-size batches
+def iter_pages(file_path):
+    """Yield PDF pages one at a time instead of loading the whole document."""
+    yield from PyPDFLoader(file_path).lazy_load()
 
-    for file in uploaded_files:
-        filename = file["filename"]
-        content = file["content"]
 
-        save_path = Path(UPLOAD_DIR) / filename
-        with open(save_path, "wb") as f:
-            f.write(content)
-        file_paths.append(str(save_path))
+def iter_child_chunks(pages, splitter, report_id, filename):
+    """Store each page as a parent in the page store, then yield its small child chunks."""
+    for page in pages:
+        page_number = page.metadata.get("page", 0)
+        parent_id = parent_id_for(report_id, page_number)
+        save_page(parent_id, report_id, filename, page_number, page.page_content)
+        for child in splitter.split_documents([page]):
+            child.metadata["parent_id"] = parent_id
+            yield child
 
-    for file_path in file_paths:
-        print(f"📘 Processing file: {file_path}")
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
-
-        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        chunks = splitter.split_documents(documents)
-
-        texts = [chunk.page_content for chunk in chunks]
-        metadatas = [
-            {
-                "filename": Path(file_path).name,
-                "type": doc_type,
-                "source": "user_upload",
-                "page": chunk.metadata.get("page", 0),
-                "text": chunk.page_content
-            }
-            for chunk in chunks
-        ]
-
-        ids = [f"{Path(file_path).stem}-{i}" for i in range(len(chunks))]
-
-        print(f"🔍 Embedding {len(texts)} chunks...")
-        embeddings = embed_model.embed_documents(texts)
-
-        print("📤 Uploading to Pinecone...")
-        with tqdm(total=len(embeddings), desc=f"Upserting {Path(file_path).name}") as progress:
-            batch_upsert(index, ids, embeddings, metadatas, batch_size=100)
-            progress.update(len(embeddings))
 
+def iter_batches(items, batch_size):
+    items = iter(items)
+    while batch := list(islice(items, batch_size)):
+        yield batch
+
+
+# ✅ Main function to embed and upload
+def load_vectorstore(file_paths, doc_type="lab_report", patient_id=None, batch_size=EMBED_BATCH_SIZE,
+                     filenames=None):
+    """Embed PDFs already saved on disk into Pinecone.
+
+    Pages are read lazily and chunked, embedded and upserted ``batch_size``
+    chunks at a time, so peak memory does not grow with document length.
+    Small child chunks are embedded for precise matching; the full page text
+    (the parent) goes to the local page store and only a ``parent_id`` is kept
+    in Pinecone metadata. Every file gets a fresh ``report_id``; when a
+    ``patient_id`` is given the chunks go to that patient's namespace so
+    questions can be scoped to one patient or one report. ``filenames`` are the
+    original upload names (same order as ``file_paths``) recorded in metadata;
+    they default to the on-disk names.
+    """
+    namespace = patient_id or None
+    index = get_index()
+    local_store = get_local_vector_store(embedding_dim)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHILD_CHUNK_SIZE, chunk_overlap=CHILD_CHUNK_OVERLAP)
+    summary = []
+
+    for file_path, filename in zip(file_paths, filenames or [Path(p).name for p in file_paths]):
+        print(f"📘 Processing file: {file_path}")
+        report_id = uuid.uuid4().hex[:12]
+        chunk_count = 0
+
+        with tqdm(desc=f"Embedding + upserting {filename}", unit="chunk") as progress:
+            children = iter_child_chunks(iter_pages(file_path), splitter, report_id, filename)
+            for chunks in iter_batches(children, batch_size):
+                texts = [chunk.page_content for chunk in chunks]
+                metadatas = [
+                    {
+                        "filename": filename,
+                        "report_id": report_id,
+                        "type": doc_type,
+                        "source": "user_upload",
+                        "page": chunk.metadata.get("page", 0),
+                        "parent_id": chunk.metadata["parent_id"],
+                        **({"patient_id": patient_id} if patient_id else {})
+                    }
+                    for chunk in chunks
+                ]
+                ids = [f"{report_id}-{chunk_count + i}" for i in range(len(chunks))]
+
+                embeddings = embed_model.embed_array(texts)
+                batch_upsert(index, ids, embeddings, metadatas, batch_size=100, namespace=namespace)
+                if local_store is not None:
+                    local_store.add(ids, embeddings, parent_ids=[m["parent_id"] for m in metadatas])
+
+                chunk_count += len(chunks)
+                progress.update(len(chunks))
+
+        print(f"🧮 Embedding cache: {embed_model.hits} hits / {embed_model.misses} misses so far")
         print(f"✅ Upload complete for {file_path}")
-        summary.append({"file": Path(file_path).name, "chunks": len(chunks)})
+        summary.append({
+            "file": filename,
+            "report_id": report_id,
+            "patient_id": patient_id,
+            "chunks": chunk_count
+        })
 
     return {"status": "success", "uploaded_files": summary}
@@ -0,0 +1,247 @@
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# ✅ Local copy of every embedded chunk (offline / local similarity search)
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "./vector_cache")
+LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "off")  # float32 | float16 | int8 | off
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+
+def as_float32_matrix(embeddings) -> np.ndarray:
+    """Turn a list of embedding lists into one contiguous (n, dim) float32 array."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    return np.ascontiguousarray(matrix)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+def quantize(vectors: np.ndarray, dtype: str):
+    """Encode float32 rows as float32/float16, or int8 with one float32 scale per row."""
+    if dtype == "float32":
+        return vectors.astype(np.float32), None
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unsupported vector dtype '{dtype}'. Use one of {SUPPORTED_DTYPES}.")
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray = None) -> np.ndarray:
+    vectors = codes.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+    return vectors
+
+
+class LocalVectorStore:
+    """Append-only, memory-mapped store of unit-normalized chunk embeddings.
+
+    Layout inside ``directory``:
+      vectors.<dtype>.bin  raw row-major codes
+      scales.f32.bin       per-row scales (int8 only)
+      ids.<dtype>.txt      "<vector id>\t<parent id>" per line, same order as the rows
+
+    Each dtype keeps its own ID list, so switching LOCAL_VECTOR_DTYPE starts a
+    fresh store instead of pairing old IDs with rows of another encoding. The
+    parent ID points at the page text in the page store, so hits can be turned
+    back into context. IDs are held in memory and only lines appended since the
+    last call (by this or another process) are read.
+    """
+
+    def __init__(self, directory: str, dim: int, dtype: str = "float16"):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector dtype '{dtype}'. Use one of {SUPPORTED_DTYPES}.")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.dtype = dtype
+        self.vectors_path = self.directory / f"vectors.{dtype}.bin"
+        self.scales_path = self.directory / "scales.f32.bin"
+        self.ids_path = self.directory / f"ids.{dtype}.txt"
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._parents: List[str] = []
+        self._ids_offset = 0
+        self._repair()
+        self._refresh()
+
+    @property
+    def bytes_per_vector(self) -> int:
+        size = self.dim * np.dtype(self.dtype).itemsize
+        return size + (4 if self.dtype == "int8" else 0)
+
+    def _repair(self):
+        """Drop rows left behind by an interrupted append.
+
+        IDs are written last, so a complete ID line always has its vector and
+        scale — anything past the last one is truncated before the next append.
+        """
+        count = 0
+        if self.ids_path.exists():
+            with open(self.ids_path, "rb") as f:
+                data = f.read()
+            count = data.count(b"\n")
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                os.truncate(self.ids_path, complete)
+        sizes = [(self.vectors_path, count * self.dim * np.dtype(self.dtype).itemsize)]
+        if self.dtype == "int8":
+            sizes.append((self.scales_path, count * 4))
+        for path, size in sizes:
+            if path.exists() and path.stat().st_size > size:
+                os.truncate(path, size)
+
+    def _refresh(self):
+        """Read ID lines appended since the last refresh."""
+        if not self.ids_path.exists() or self.ids_path.stat().st_size <= self._ids_offset:
+            return
+        with open(self.ids_path, "rb") as f:
+            f.seek(self._ids_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # another process is mid-append
+                vector_id, _, parent_id = line[:-1].decode().partition("\t")
+                self._ids.append(vector_id)
+                self._parents.append(parent_id)
+                self._ids_offset += len(line)
+
+    def add(self, ids: List[str], embeddings, parent_ids: Optional[List[str]] = None) -> None:
+        """Normalize, quantize and append a batch of embeddings (with the parent page of each)."""
+        vectors = normalize_rows(as_float32_matrix(embeddings))
+        if vectors.shape != (len(ids), self.dim):
+            raise ValueError(f"Expected {len(ids)} x {self.dim} vectors, got {vectors.shape}")
+        codes, scales = quantize(vectors, self.dtype)
+        parent_ids = parent_ids or [""] * len(ids)
+
+        with self._lock:
+            try:
+                with open(self.vectors_path, "ab") as f:
+                    f.write(codes.tobytes())
+                if scales is not None:
+                    with open(self.scales_path, "ab") as f:
+                        f.write(scales.tobytes())
+                with open(self.ids_path, "a") as f:
+                    f.writelines(f"{vector_id}\t{parent_id}\n" for vector_id, parent_id in zip(ids, parent_ids))
+            except BaseException:
+                self._repair()
+                raise
+            finally:
+                self._refresh()
+
+    def _load(self):
+        with self._lock:
+            self._refresh()
+            count = len(self._ids)
+        if not count:
+            return 0, None, None
+        codes = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(count, self.dim))
+        scales = None
+        if self.dtype == "int8":
+            scales = np.memmap(self.scales_path, dtype=np.float32, mode="r", shape=(count,))
+        return count, codes, scales
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._ids)
+
+    def _scores(self, query_vector, block_size: int):
+        count, codes, scales = self._load()
+        if not count:
+            return np.empty(0, dtype=np.float32)
+        query = normalize_rows(as_float32_matrix(query_vector))[0]
+
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, block_size):
+            stop = min(start + block_size, count)
+            block_scales = scales[start:stop] if scales is not None else None
+            scores[start:stop] = dequantize(codes[start:stop], block_scales) @ query
+        return scores
+
+    def search(self, query_vector, top_k: int = 5, block_size: int = 65536) -> List[Tuple[str, float]]:
+        """Cosine top-k over the stored vectors, dequantizing one block at a time."""
+        scores = self._scores(query_vector, block_size)
+        if not len(scores):
+            return []
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(self._ids[i], float(scores[i])) for i in best]
+
+    def search_parents(self, query_vector, top_k: int = 5, block_size: int = 65536) -> List[Tuple[str, float]]:
+        """Best-scoring parent pages (IDs for ``page_store.get_pages``), one entry per page."""
+        scores = self._scores(query_vector, block_size)
+        best: Dict[str, float] = {}
+        for i in np.argsort(-scores):
+            parent_id = self._parents[i]
+            if parent_id and parent_id not in best:
+                best[parent_id] = float(scores[i])
+                if len(best) == top_k:
+                    break
+        return list(best.items())
+
+
+@lru_cache(maxsize=1)
+def get_local_vector_store(dim: int = 384):
+    """Process-wide local store, or None when LOCAL_VECTOR_DTYPE=off."""
+    if LOCAL_VECTOR_DTYPE == "off":
+        return None
+    return LocalVectorStore(LOCAL_VECTOR_DIR, dim=dim, dtype=LOCAL_VECTOR_DTYPE)
+
+
+def measure_quantization_tradeoff(vectors, queries, top_k: int = 10) -> List[dict]:
+    """Recall@k against exact float32 search, storage size and search latency for each dtype."""
+    import tempfile
+
+    vectors = as_float32_matrix(vectors)
+    queries = as_float32_matrix(queries)
+    ids = [str(i) for i in range(len(vectors))]
+    results = []
+    truth = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in SUPPORTED_DTYPES:
+            store = LocalVectorStore(Path(tmp) / dtype, dim=vectors.shape[1], dtype=dtype)
+            store.add(ids, vectors)
+
+            start = time.perf_counter()
+            hits = [[vector_id for vector_id, _ in store.search(q, top_k)] for q in queries]
+            elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            if truth is None:
+                truth = hits
+            recall = np.mean([len(set(h) & set(t)) / len(t) for h, t in zip(hits, truth)])
+            results.append({
+                "dtype": dtype,
+                "bytes_per_vector": store.bytes_per_vector,
+                "total_mb": round(store.bytes_per_vector * len(vectors) / 1e6, 2),
+                f"recall@{top_k}": round(float(recall), 4),
+                "ms_per_query": round(elapsed_ms, 3),
+            })
+    return results
+
+
+if __name__ == "__main__":
+    # 📏 Benchmark on synthetic clustered 384-d vectors (shape of MiniLM output)
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(200, 384)).astype(np.float32)
+    corpus = centers[rng.integers(0, 200, 50_000)] + 0.5 * rng.normal(size=(50_000, 384)).astype(np.float32)
+    sample_queries = corpus[rng.integers(0, len(corpus), 200)] + 0.3 * rng.normal(size=(200, 384)).astype(np.float32)
+
+    for row in measure_quantization_tradeoff(corpus, sample_queries, top_k=10):
+        print(row)
@@ -1,9 +1,14 @@
 import os
 import shutil
-from fastapi import UploadFile
+import uuid
+from fastapi import UploadFile, HTTPException
 import tempfile
 
 UPLOAD_DIR="./uploaded_docs"
+MAX_UPLOAD_BYTES=int(os.getenv("MAX_UPLOAD_MB","50"))*1024*1024
+UPLOAD_CHUNK_BYTES=1024*1024
+MAX_UPLOAD_FILES=int(os.getenv("MAX_UPLOAD_FILES","10"))
+FORM_OVERHEAD_BYTES=64*1024  # multipart boundaries + form fields
 
 def save_uploaded_files(files:list[UploadFile])-> list[str]:
     os.makedirs(UPLOAD_DIR,exist_ok=True)
@@ -13,4 +18,31 @@ def save_uploaded_files(files:list[UploadFile])-> list[str]:
         with open(temp_path,"wb") as f:
             shutil.copyfileobj(file.file,f)
         file_path.append(temp_path)
-    return file_path
\ No newline at end of file
+    return file_path
+
+def original_filename(file:UploadFile)-> str:
+    """Client-side name of an upload, without any directory part."""
+    return os.path.basename(file.filename or "") or "upload.pdf"
+
+async def stream_upload_to_disk(file:UploadFile,upload_dir:str=UPLOAD_DIR,max_bytes:int=MAX_UPLOAD_BYTES)-> str:
+    """Copy an upload to disk 1 MB at a time; reject it with 413 once it exceeds max_bytes.
+
+    Each upload gets its own ``<uuid>-<name>`` path so concurrent uploads of the
+    same filename never overwrite each other; keep the original name for metadata.
+    """
+    os.makedirs(upload_dir,exist_ok=True)
+    filename=original_filename(file)
+    save_path=os.path.join(upload_dir,f"{uuid.uuid4().hex}-{filename}")
+    written=0
+    try:
+        with open(save_path,"wb") as f:
+            while chunk:=await file.read(UPLOAD_CHUNK_BYTES):
+                written+=len(chunk)
+                if written>max_bytes:
+                    raise HTTPException(status_code=413,detail=f"{filename} exceeds the {max_bytes//(1024*1024)} MB upload limit")
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(save_path):
+            os.remove(save_path)
+        raise
+    return save_path
@@ -1,11 +1,32 @@
+import hashlib
+import os
 from backend.logger import logger
+from backend.utils.ttl_cache import get_shared_cache
 
-def query_chain(chain, user_input: str):
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+answer_cache = get_shared_cache("answers", maxsize=5000, ttl=ANSWER_CACHE_TTL)
+
+
+def answer_cache_key(question: str, docs) -> str:
+    """Same question over the same retrieved context → same answer."""
+    digest = hashlib.sha256(" ".join(question.split()).lower().encode("utf-8"))
+    for doc in docs:
+        digest.update(b"\0" + doc.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def query_chain(chain, inputs: dict, cache_key: str = None):
     try:
-        logger.debug(f"Running chain for input: {user_input}")
-        
+        logger.debug(f"Running chain for input: {inputs.get('question')}")
+
+        if cache_key:
+            cached = answer_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Answer cache hit")
+                return cached
+
         # Run LCEL chain — returns a plain string
-        result = chain.invoke({"question": user_input})
+        result = chain.invoke(inputs)
         
         # Build a consistent response object
         response = {
@@ -13,6 +34,9 @@ def query_chain(chain, user_input: str):
             "sources": []        # Optional: add retrieved docs here later
         }
 
+        if cache_key:
+            answer_cache.set(cache_key, response)
+
         logger.debug(f"Chain response: {response}")
         return response
 
@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional
+
+# ====================================
+# ⚠️ Errors
+# ====================================
+class UpstreamUnavailableError(Exception):
+    """An upstream was skipped without calling it; retry after ``retry_after`` seconds."""
+
+    def __init__(self, upstream: str, message: str, retry_after: float = 1.0):
+        super().__init__(f"[{upstream}] {message}")
+        self.upstream = upstream
+        self.retry_after = max(1, int(round(retry_after)))
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    pass
+
+
+class UpstreamSaturatedError(UpstreamUnavailableError):
+    pass
+
+
+class UpstreamTimeoutError(Exception):
+    pass
+
+# ====================================
+# 🪣 Token bucket rate limiter
+# ====================================
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float) -> bool:
+        """Take one token, waiting at most ``timeout`` seconds for it."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class SharedTokenBucket:
+    """Token bucket kept in the shared SQLite file, so one rate holds across all worker processes."""
+
+    def __init__(self, path: str, name: str, rate: float, capacity: Optional[float] = None):
+        self.path = path
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._local = threading.local()
+        self._conn().execute(
+            """CREATE TABLE IF NOT EXISTS rate_limits (
+                   name       TEXT PRIMARY KEY,
+                   tokens     REAL NOT NULL,
+                   updated_at REAL NOT NULL
+               )"""
+        )
+
+    def _conn(self):
+        # One connection per thread (and per process — a forked worker opens its own)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _take(self) -> float:
+        """Take one token if available; otherwise return the seconds until one is."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_limits WHERE name = ?", (self.name,)).fetchone()
+            now = time.time()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            if not wait:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)",
+                         (self.name, tokens, now))
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire(self, timeout: float) -> bool:
+        """Take one token, waiting at most ``timeout`` seconds for it."""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+def make_rate_limiter(name: str, rate: float):
+    """Shared bucket when SHARED_CACHE_PATH is set (multi-worker mode), else an in-process one."""
+    path = os.getenv("SHARED_CACHE_PATH")
+    if path:
+        return SharedTokenBucket(path, name, rate)
+    return TokenBucket(rate)
+
+# ====================================
+# 🔌 Circuit breaker
+# ====================================
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; lets one probe through after ``reset_timeout``."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._probe_in_flight:
+                self._probe_in_flight = True  # half-open: one trial request
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def cancel_probe(self):
+        """Give the half-open trial slot back when the request never reached the upstream."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+# ====================================
+# 🛡️ Upstream = rate limit + breaker + bulkhead + timeout
+# ====================================
+_timeout_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="upstream")
+
+
+class Upstream:
+    def __init__(self, name: str, rate: float, max_concurrency: int, timeout: float,
+                 max_wait: float = 2.0, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.timeout = timeout
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.limiter = make_rate_limiter(name, rate)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._in_flight = 0
+        self._count_lock = threading.Lock()
+
+    def saturated(self) -> bool:
+        with self._count_lock:
+            return self._in_flight >= self.max_concurrency
+
+    def call(self, fn, *args, hard_timeout: bool = False, max_wait: Optional[float] = None, **kwargs):
+        """Run ``fn`` under this upstream's limits.
+
+        Raises CircuitOpenError / UpstreamSaturatedError immediately instead of
+        waiting on a failing or overloaded service. With ``hard_timeout`` the call
+        is abandoned after ``self.timeout`` seconds even if ``fn`` has no timeout.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.name, "circuit open, skipping", self.breaker.retry_after())
+        if not self._slots.acquire(timeout=max_wait):
+            self.breaker.cancel_probe()
+            raise UpstreamSaturatedError(self.name, "too many concurrent requests", max_wait)
+        with self._count_lock:
+            self._in_flight += 1
+        try:
+            if not self.limiter.acquire(timeout=max_wait):
+                self.breaker.cancel_probe()
+                raise UpstreamSaturatedError(self.name, "rate limit reached", 1.0 / self.limiter.rate)
+            try:
+                if hard_timeout:
+                    result = _timeout_pool.submit(fn, *args, **kwargs).result(timeout=self.timeout)
+                else:
+                    result = fn(*args, **kwargs)
+            except FutureTimeoutError:
+                self.breaker.record_failure()
+                raise UpstreamTimeoutError(f"[{self.name}] no response after {self.timeout}s")
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return result
+        finally:
+            with self._count_lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+
+# ✅ Per-upstream limits (NCBI allows 3 req/s, or 10 req/s with an API key).
+# Rates are global: in multi-worker mode every process draws from the same shared bucket.
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+_upstreams: Dict[str, Upstream] = {
+    "pubmed": Upstream("pubmed", rate=10 if NCBI_API_KEY else 3, max_concurrency=4, timeout=5),
+    "duckduckgo": Upstream("duckduckgo", rate=1, max_concurrency=2, timeout=8),
+    "web": Upstream("web", rate=10, max_concurrency=8, timeout=5, failure_threshold=10),
+    "pinecone": Upstream("pinecone", rate=50, max_concurrency=16, timeout=5),
+    "groq": Upstream("groq", rate=float(os.getenv("LLM_RATE_PER_SEC", "5")),
+                     max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT, max_wait=5.0),
+}
+
+
+def get_upstream(name: str) -> Upstream:
+    return _upstreams[name]
@@ -1,6 +1,6 @@
 from langchain_core.documents import Document
 from langchain_community.tools import DuckDuckGoSearchResults
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from backend.modules.embedding_cache import get_embedder
 from pinecone import Pinecone
 from typing import List
 import os
@@ -42,7 +42,7 @@ class PineconeRetriever:
         self.index_name = "medicalassistantindex"
         self.pc = Pinecone(api_key=PINECONE_API_KEY)
         self.index = self.pc.Index(self.index_name)
-        self.embed_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        self.embed_model = get_embedder()
 
     def retrieve(self, query: str, top_k=3) -> List[Document]:
         """Retrieve from uploaded Pinecone documents"""
@@ -1,57 +1,184 @@
-from fastapi import APIRouter, Form
-from fastapi.responses import JSONResponse
-from backend.modules.llm import get_llm_chain
-from backend.modules.query_handlers import query_chain
-from backend.modules.hybrid_retriver import HybridRetriever
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.documents import Document
-from langchain_core.retrievers import BaseRetriever
-from pydantic import Field
+from fastapi import APIRouter, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from backend.modules.llm import get_answer_chain, format_docs
+from backend.modules.query_handlers import answer_cache, answer_cache_key
+from backend.modules.conversation import answer_in_session
+from backend.modules.hybrid_retriver import HybridRetriever, build_query_scope
+from backend.modules.resilience import get_upstream, UpstreamSaturatedError, UpstreamUnavailableError
+from backend.utils.report_store import get_report, find_reports_by_filename
+from backend.modules.embedding_cache import get_embedder
+from pydantic import BaseModel, Field
 from typing import List, Optional
+from functools import lru_cache
 from backend.logger import logger
 from dotenv import load_dotenv
+import asyncio
+import json
 import os
 
 load_dotenv()
 router = APIRouter()
 
-@router.post("/ask/")
-async def ask_question(question: str = Form(...)):
-    try:
-        logger.info(f"🧠 User query: {question}")
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "medicalassistantindex")
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "4"))
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "500"))
+LLM_BATCH_QUEUE_WAIT = float(os.getenv("LLM_BATCH_QUEUE_WAIT", "30"))
+RETRIEVAL_BATCH_QUEUE_WAIT = float(os.getenv("RETRIEVAL_BATCH_QUEUE_WAIT", "30"))
+BATCH_RETRIEVAL_CHUNK = int(os.getenv("BATCH_RETRIEVAL_CHUNK", "16"))
+NO_RESULTS_MESSAGE = "No relevant information found in trusted sources or PDFs."
 
-        # Step 1: Load embeddings
-        embed_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "medicalassistantindex")
 
-        # Step 2: Hybrid retrieval (PubMed + PDFs + Web)
-        retriever_manager = HybridRetriever(index_name=PINECONE_INDEX_NAME, embedder=embed_model)
-        docs = retriever_manager.retrieve(question)
+@lru_cache(maxsize=1)
+def get_hybrid_retriever() -> HybridRetriever:
+    """Build the embedding model and retrievers once per process instead of per request."""
+    return HybridRetriever(index_name=PINECONE_INDEX_NAME, embedder=get_embedder())
 
-        if not docs:
-            return {"response": "No relevant information found in trusted sources or PDFs."}
 
-        # Step 3: Wrap docs into retriever
-        class CombinedRetriever(BaseRetriever):
-            tags: Optional[List[str]] = Field(default_factory=list)
-            metadata: Optional[dict] = Field(default_factory=dict)
+def resolve_query_scope(report_id: Optional[str] = None, patient_id: Optional[str] = None,
+                        filenames: Optional[List[str]] = None) -> dict:
+    """Build the Pinecone scope; a bare report ID or filename is mapped to the namespace it was uploaded into."""
+    if report_id and not patient_id:
+        report = get_report(report_id)
+        if report:
+            patient_id = report.get("patient_id")
+    elif filenames and not patient_id:
+        namespaces = {entry.get("patient_id") for entry in find_reports_by_filename(filenames)}
+        if len(namespaces) > 1:
+            # One query targets one namespace; the caller has to pick the patient
+            raise HTTPException(status_code=400,
+                                detail="Filenames belong to different patients; pass patient_id or report_id")
+        if namespaces:
+            patient_id = namespaces.pop()
+    return build_query_scope(report_id=report_id, patient_id=patient_id, filenames=filenames)
 
-            def __init__(self, documents: List[Document]):
-                super().__init__()
-                self._docs = documents
 
-            def _get_relevant_documents(self, query: str) -> List[Document]:
-                return self._docs
+class BatchQuestionRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_QUESTIONS)
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    report_id: Optional[str] = None
+    patient_id: Optional[str] = None
+    filenames: Optional[List[str]] = None
+
+
+@router.post("/ask/")
+async def ask_question(
+    question: str = Form(...),
+    report_id: Optional[str] = Form(None),
+    patient_id: Optional[str] = Form(None),
+    filenames: Optional[List[str]] = Form(None),
+    session_id: Optional[str] = Form(None),
+):
+    try:
+        logger.info(f"🧠 User query: {question}")
+        scope = resolve_query_scope(report_id, patient_id, filenames)
 
-        retriever = CombinedRetriever(docs)
+        # Session-aware retrieval: follow-ups reuse the cached documents when they suffice
+        retriever_manager = get_hybrid_retriever()
+        result = await run_in_threadpool(answer_in_session, question, session_id, scope, retriever_manager)
 
-        # Step 4: Build LLM chain
-        chain = get_llm_chain(retriever)
-        result = query_chain(chain, question)
+        if result["response"] is None:
+            return {"response": NO_RESULTS_MESSAGE, "session_id": result["session_id"]}
 
         logger.info("✅ Query processed successfully")
         return result
 
+    except (HTTPException, UpstreamUnavailableError):
+        raise  # → 400 / 503 with Retry-After
     except Exception as e:
         logger.exception("❌ Error processing user query")
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.post("/ask/batch")
+async def ask_questions_batch(request: BatchQuestionRequest):
+    """Answer many questions in one call; results stream back as NDJSON in completion order.
+
+    Questions are retrieved in chunks of BATCH_RETRIEVAL_CHUNK; the next chunk is
+    retrieved while the LLM answers the current one, so the first lines arrive
+    long before retrieval for the whole batch has finished.
+    """
+    try:
+        questions = request.questions
+        logger.info(f"🧠 Batch query: {len(questions)} questions")
+
+        # Step 0: Refuse early (503) instead of queueing behind a saturated LLM
+        if get_upstream("groq").saturated():
+            raise UpstreamSaturatedError("groq", "LLM queue is full", LLM_BATCH_QUEUE_WAIT)
+
+        scope = resolve_query_scope(request.report_id, request.patient_id, request.filenames)
+        retriever_manager = get_hybrid_retriever()
+    except (HTTPException, UpstreamUnavailableError):
+        raise
+    except Exception as e:
+        logger.exception("❌ Error during batch setup")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    max_concurrency = min(request.max_concurrency or LLM_BATCH_CONCURRENCY, LLM_BATCH_CONCURRENCY)
+    chunks = [range(start, min(start + BATCH_RETRIEVAL_CHUNK, len(questions)))
+              for start in range(0, len(questions), BATCH_RETRIEVAL_CHUNK)]
+
+    def retrieve_chunk(chunk):
+        # Shared retrieval (one embedding call, concurrent Pinecone/PubMed/Web lookups)
+        return asyncio.ensure_future(run_in_threadpool(
+            retriever_manager.retrieve_many, [questions[i] for i in chunk],
+            max_wait=RETRIEVAL_BATCH_QUEUE_WAIT, **scope
+        ))
+
+    async def stream_answers():
+        chain = get_answer_chain(max_wait=LLM_BATCH_QUEUE_WAIT)
+        pending = retrieve_chunk(chunks[0])
+        try:
+            for n, chunk in enumerate(chunks):
+                # Step 1: Wait for this chunk's documents, then start retrieving the next chunk
+                try:
+                    docs_per_question = dict(zip(chunk, await pending))
+                except Exception as e:
+                    logger.exception("❌ Error during batch retrieval")
+                    docs_per_question = {i: None for i in chunk}
+                    for i in chunk:
+                        yield json.dumps({"index": i, "question": questions[i], "error": str(e)}) + "\n"
+                pending = retrieve_chunk(chunks[n + 1]) if n + 1 < len(chunks) else None
+
+                # Step 2: Questions without context or with a cached answer are returned immediately
+                cache_keys, answerable = {}, []
+                for i, docs in docs_per_question.items():
+                    if docs is None:
+                        continue
+                    if not docs:
+                        yield json.dumps({"index": i, "question": questions[i], "response": NO_RESULTS_MESSAGE}) + "\n"
+                        continue
+                    cache_keys[i] = answer_cache_key(questions[i], docs)
+                    cached = answer_cache.get(cache_keys[i])
+                    if cached is not None:
+                        yield json.dumps({"index": i, "question": questions[i], **cached}) + "\n"
+                    else:
+                        answerable.append(i)
+
+                # Step 3: LLM calls with bounded concurrency, emitted as each one finishes
+                inputs = [
+                    {"context": format_docs(docs_per_question[i]), "question": questions[i]}
+                    for i in answerable
+                ]
+                async for pos, result in chain.abatch_as_completed(
+                    inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True
+                ):
+                    i = answerable[pos]
+                    if isinstance(result, Exception):
+                        logger.error(f"❌ Batch question {i} failed: {result}")
+                        line = {"index": i, "question": questions[i], "error": str(result)}
+                        if isinstance(result, UpstreamUnavailableError):
+                            line["retry_after"] = result.retry_after
+                    else:
+                        answer = {"response": result, "sources": []}
+                        answer_cache.set(cache_keys[i], answer)
+                        line = {"index": i, "question": questions[i], **answer}
+                    yield json.dumps(line) + "\n"
+        finally:
+            # Client went away mid-stream: don't leave the prefetch running
+            if pending is not None:
+                pending.cancel()
+
+        logger.info("✅ Batch processed successfully")
+
+    return StreamingResponse(stream_answers(), media_type="application/x-ndjson")
@@ -1,13 +1,18 @@
 # routes/lab_reports.py
 
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from backend.modules.load_vectorstore import load_vectorstore
+from backend.modules.load_vectorstore import load_vectorstore, iter_pages
+from backend.modules.pdf_handlers import stream_upload_to_disk, original_filename
+from backend.modules.ingestion_queue import INGESTION_MODE, submit_ingestion
+from backend.modules.resilience import get_upstream, UpstreamUnavailableError, LLM_TIMEOUT
+from backend.utils.report_store import save_report_metadata
 from dotenv import load_dotenv
+from typing import Optional
 import os
 
 router = APIRouter()
@@ -19,6 +24,8 @@ llm = ChatGroq(
     groq_api_key=GROQ_API_KEY,
     model_name="meta-llama/llama-4-scout-17b-16e-instruct",
     temperature=0.2,
+    timeout=LLM_TIMEOUT,
+    max_retries=1,
 )
 
 analysis_prompt = ChatPromptTemplate.from_template("""
@@ -35,24 +42,21 @@ Return in **strict JSON format** as below:
 """)
 
 @router.post("/upload_and_analyze_lab_report/")
-async def upload_and_analyze_lab_report(file: UploadFile = File(...)):
+async def upload_and_analyze_lab_report(file: UploadFile = File(...), patient_id: Optional[str] = Form(None)):
     import re, json, traceback
     try:
-        os.makedirs("./uploaded_docs", exist_ok=True)
-        path = f"./uploaded_docs/{file.filename}"
-        with open(path, "wb") as f:
-            f.write(await file.read())
+        path = await stream_upload_to_disk(file)
+        filename = original_filename(file)
 
         print(f"✅ Uploaded file saved at: {path}")
 
-        loader = PyPDFLoader(path)
-        pages = loader.load()
-        report_text = "\n".join([p.page_content for p in pages])
+        # PDF parsing, the LLM call and embedding block — keep them off the event loop
+        report_text = await run_in_threadpool(lambda: "\n".join(p.page_content for p in iter_pages(path)))
         print(f"✅ Extracted {len(report_text)} characters from PDF")
 
         chain = analysis_prompt | llm | StrOutputParser()
         print("🧠 Invoking Groq LLM...")
-        raw_analysis = chain.invoke({"report_text": report_text})
+        raw_analysis = await run_in_threadpool(get_upstream("groq").call, chain.invoke, {"report_text": report_text})
         print(f"✅ LLM Response:\n{raw_analysis}")
 
         # ✅ Extract clean JSON
@@ -74,17 +78,31 @@ async def upload_and_analyze_lab_report(file: UploadFile = File(...)):
         else:
             analysis = {"raw_text": raw_analysis}
 
-        # ✅ Add to vector DB
-        file.file.seek(0)
-        load_vectorstore([{"filename": file.filename, "content": file.file.read()}])
+        # ✅ Add to vector DB (queued for the ingestion worker in multi-worker mode)
+        if INGESTION_MODE == "queue":
+            job_id = submit_ingestion([path], patient_id=patient_id, filenames=[filename])
+            print(f"📥 Queued for vector database (job {job_id})")
+            return {
+                "filename": filename,
+                "job_id": job_id,
+                "analysis": analysis,
+                "message": "Report analyzed and queued for the vector database."
+            }
+
+        stored = await run_in_threadpool(load_vectorstore, [path], patient_id=patient_id, filenames=[filename])
+        record = stored["uploaded_files"][0]
+        save_report_metadata(record["file"], record["chunks"], record["report_id"], record["patient_id"])
         print("📚 Added to vector database")
 
         return {
-            "filename": file.filename,
+            "filename": filename,
+            "report_id": record["report_id"],
             "analysis": analysis,  # now this is clean JSON, not a string
             "message": "Report analyzed and stored in vector database."
         }
 
+    except (HTTPException, UpstreamUnavailableError):
+        raise
     except Exception as e:
         print("❌ Exception:", traceback.format_exc())
         return JSONResponse(status_code=500, content={"error": str(e)})
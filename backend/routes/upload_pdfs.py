@@ -1,6 +1,9 @@
-from fastapi import APIRouter, UploadFile, File
-from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
 from backend.modules.load_vectorstore import load_vectorstore
+from backend.modules.pdf_handlers import stream_upload_to_disk, original_filename, MAX_UPLOAD_FILES
+from backend.modules.ingestion_queue import INGESTION_MODE, submit_ingestion, get_job
 from fastapi.responses import JSONResponse
 from backend.logger import logger
 from backend.utils.report_store import save_report_metadata  # ✅ new import
@@ -8,29 +11,49 @@ from backend.utils.report_store import save_report_metadata  # ✅ new import
 router = APIRouter()
 
 @router.post("/upload_pdfs/")
-async def upload_pdfs(files: List[UploadFile] = File(...)):
+async def upload_pdfs(files: List[UploadFile] = File(...), patient_id: Optional[str] = Form(None)):
     try:
         logger.info("📄 Received uploaded files")
+        if len(files) > MAX_UPLOAD_FILES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_UPLOAD_FILES} files per upload")
 
-        # ✅ Step 1: Read files in memory
-        file_objects = []
-        for file in files:
-            content = await file.read()
-            file_objects.append({
-                "filename": file.filename,
-                "content": content
+        # ✅ Step 1: Stream files to disk (size-capped, never fully in memory)
+        file_paths = [await stream_upload_to_disk(file) for file in files]
+        filenames = [original_filename(file) for file in files]
+
+        # ✅ Multi-worker mode: hand off to the shared ingestion worker
+        if INGESTION_MODE == "queue":
+            job_id = submit_ingestion(file_paths, patient_id=patient_id, filenames=filenames)
+            logger.info(f"📥 Queued ingestion job {job_id}")
+            return JSONResponse(status_code=202, content={
+                "message": f"Queued {len(file_paths)} files for processing.",
+                "job_id": job_id
             })
 
         # ✅ Step 2: Pass to vectorstore loader (returns number of chunks per file)
-        processed_files = load_vectorstore(file_objects)  # <-- we’ll modify this to return metadata
+        result = await run_in_threadpool(load_vectorstore, file_paths, patient_id=patient_id, filenames=filenames)
+        processed_files = result["uploaded_files"]
 
         # ✅ Step 3: Log metadata locally for tracking
         for record in processed_files:
-            save_report_metadata(record["filename"], record["chunks"])
+            save_report_metadata(record["file"], record["chunks"], record["report_id"], record["patient_id"])
 
         logger.info("✅ Files processed, embedded, and metadata stored")
-        return {"message": f"Processed {len(processed_files)} files successfully."}
+        return {
+            "message": f"Processed {len(processed_files)} files successfully.",
+            "uploaded_files": processed_files
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("❌ Error during PDF upload")
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.get("/ingestion_jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job '{job_id}'"})
+    return job
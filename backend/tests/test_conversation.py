@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from backend.modules import conversation
+from backend.modules.conversation import compact_history, estimate_tokens, load_session, save_session
+from backend.modules.hybrid_retriver import HybridRetriever
+
+
+@pytest.fixture
+def retriever():
+    # Routing helpers need no Pinecone / PubMed clients — skip __init__
+    return HybridRetriever.__new__(HybridRetriever)
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+# ====================================
+# compact_history
+# ====================================
+def turn(i, size=10):
+    return {"question": f"q{i}", "answer": "x" * size}
+
+
+def test_empty_history():
+    assert compact_history([]) == "(no previous turns)"
+
+
+def test_recent_turns_are_kept_in_order():
+    history = [turn(i) for i in range(3)]
+    text = compact_history(history, token_budget=1000)
+    assert text.index("User: q0") < text.index("User: q1") < text.index("User: q2")
+    assert "omitted" not in text
+
+
+def test_older_turns_are_dropped_to_fit_the_budget():
+    history = [turn(i, size=200) for i in range(5)]
+    per_turn = estimate_tokens(f"User: q0\nAssistant: {'x' * 200}")
+    text = compact_history(history, token_budget=per_turn * 2)
+
+    assert text.startswith("(3 earlier turns omitted)")
+    assert "User: q3" in text and "User: q4" in text
+    assert "User: q2" not in text
+
+
+def test_last_turn_is_kept_even_when_over_budget():
+    text = compact_history([turn(0, size=10_000)], token_budget=50)
+    assert "User: q0" in text
+    assert len(text) < 50 * 4 + 100
+
+
+# ====================================
+# extract_entities / classify_followup
+# ====================================
+def test_only_medical_terms_are_entities(retriever):
+    assert retriever.extract_entities("I'm worried, is that dangerous? Should I take medication?") == set()
+    assert retriever.extract_entities("What about my TSH and HbA1c?") == {"tsh", "hba1c"}
+
+
+def test_first_turn_is_full_retrieval(retriever):
+    route, _ = retriever.classify_followup("what is ldl", unit(1, 0), [], np.empty((0, 2)), set())
+    assert route == "full"
+
+
+def test_similar_followup_without_new_terms_uses_the_cache(retriever):
+    route, entities = retriever.classify_followup(
+        "is my ldl too high?", unit(1, 0.1), ["LDL cholesterol 190 mg/dL"], np.array([unit(1, 0)]), set()
+    )
+    assert (route, entities) == ("cached", set())
+
+
+def test_new_term_triggers_incremental_retrieval(retriever):
+    route, entities = retriever.classify_followup(
+        "what about my TSH?", unit(1, 0), ["LDL cholesterol 190 mg/dL"], np.array([unit(1, 0)]), {"ldl"}
+    )
+    assert (route, entities) == ("incremental", {"tsh"})
+
+
+@pytest.mark.parametrize("question, cached_text", [
+    ("what about my ALT?", "General health advice for a fast recovery"),
+    ("and my ldl?", "VLDL 30 mg/dL"),
+    ("is my iron low?", "environment and lifestyle factors"),
+    ("what about protein?", "lipoprotein(a) is normal"),
+])
+def test_terms_are_matched_as_whole_words(retriever, question, cached_text):
+    route, entities = retriever.classify_followup(
+        question, unit(1, 0), [cached_text], np.array([unit(1, 0)]), set()
+    )
+    assert route == "incremental" and entities
+
+
+def test_terms_from_earlier_questions_are_not_new(retriever):
+    route, _ = retriever.classify_followup(
+        "so is the ldl dangerous?", unit(1, 0), ["unrelated page"], np.array([unit(1, 0)]), {"ldl"}
+    )
+    assert route == "cached"
+
+
+def test_dissimilar_followup_without_terms_retrieves_again(retriever):
+    route, _ = retriever.classify_followup(
+        "what should I eat?", unit(0, 1), ["LDL cholesterol 190 mg/dL"], np.array([unit(1, 0)]), set()
+    )
+    assert route == "full"
+
+
+# ====================================
+# Sessions
+# ====================================
+SCOPE = {"namespace": "patient-1", "metadata_filter": None}
+
+
+def test_unknown_session_id_gets_a_fresh_id():
+    session = load_session("client-chosen-id", SCOPE)
+    assert session["session_id"] != "client-chosen-id"
+
+
+def test_session_is_bound_to_its_scope(monkeypatch):
+    monkeypatch.setattr(conversation, "session_store", conversation.get_shared_cache("test-sessions"))
+    session = load_session(None, SCOPE)
+    session["docs"] = [("page", {})]
+    save_session(session)
+
+    assert load_session(session["session_id"], SCOPE)["docs"] == [("page", {})]
+    unscoped = load_session(session["session_id"], {"namespace": None, "metadata_filter": None})
+    assert unscoped["session_id"] != session["session_id"] and unscoped["docs"] == []
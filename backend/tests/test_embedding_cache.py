@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from backend.modules.embedding_cache import CachedEmbeddings, MemmapEmbeddingStore
+
+
+class CountingModel:
+    """Deterministic 3-d embedding that records every batch it is asked for."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text)), float(text.count("a")), 1.0] for text in texts]
+
+
+@pytest.fixture
+def model():
+    return CountingModel()
+
+
+def make_embedder(model, cache_dir, lru_size=100):
+    return CachedEmbeddings(model, "test-model", dim=3, cache_dir=cache_dir and str(cache_dir), lru_size=lru_size)
+
+
+# ====================================
+# CachedEmbeddings
+# ====================================
+def test_misses_are_sent_to_the_model_in_one_batch(model, tmp_path):
+    embedder = make_embedder(model, tmp_path)
+    result = embedder.embed_array(["alpha", "beta", "alpha", "gamma"])
+
+    assert model.batches == [["alpha", "beta", "gamma"]]
+    assert result.shape == (4, 3)
+    np.testing.assert_array_equal(result[0], result[2])
+
+
+def test_only_new_texts_reach_the_model(model, tmp_path):
+    embedder = make_embedder(model, tmp_path)
+    embedder.embed_array(["alpha", "beta"])
+    embedder.embed_array(["beta", "delta"])
+
+    assert model.batches == [["alpha", "beta"], ["delta"]]
+    assert (embedder.hits, embedder.misses) == (1, 3)
+
+
+def test_persistent_tier_survives_a_new_process(model, tmp_path):
+    make_embedder(model, tmp_path).embed_array(["alpha", "beta"])
+    fresh = make_embedder(model, tmp_path)
+    vectors = fresh.embed_array(["beta", "alpha"])
+
+    assert model.batches == [["alpha", "beta"]]
+    np.testing.assert_array_equal(vectors[0], [4.0, 1.0, 1.0])
+
+
+def test_persist_false_keeps_texts_off_disk(model, tmp_path):
+    embedder = make_embedder(model, tmp_path)
+    embedder.embed_array(["one-off question"], persist=False)
+
+    assert len(embedder.persistent) == 0
+    make_embedder(model, tmp_path).embed_array(["one-off question"])
+    assert len(model.batches) == 2
+
+
+def test_lru_is_bounded(model, tmp_path):
+    embedder = make_embedder(model, None, lru_size=2)
+    embedder.embed_array(["a", "b", "c"])
+    embedder.embed_array(["a"])
+
+    assert model.batches == [["a", "b", "c"], ["a"]]
+
+
+# ====================================
+# MemmapEmbeddingStore
+# ====================================
+def rows(*values):
+    return np.array([[v, v, v] for v in values], dtype=np.float32)
+
+
+def test_orphan_rows_from_a_crash_are_truncated(tmp_path):
+    store = MemmapEmbeddingStore(tmp_path, dim=3)
+    store.put_many(["a", "b"], rows(1, 2))
+    # Crash after the vectors append, before the keys append
+    with open(store.vectors_path, "ab") as f:
+        f.write(rows(99).tobytes())
+
+    MemmapEmbeddingStore(tmp_path, dim=3).put_many(["c"], rows(3))
+    found = MemmapEmbeddingStore(tmp_path, dim=3).get_many(["a", "b", "c"])
+
+    assert {key: vec[0] for key, vec in found.items()} == {"a": 1, "b": 2, "c": 3}
+
+
+def test_partial_key_line_is_not_indexed(tmp_path):
+    store = MemmapEmbeddingStore(tmp_path, dim=3)
+    store.put_many(["a"], rows(1))
+    with open(store.keys_path, "a") as f:
+        f.write("half-written")
+
+    reopened = MemmapEmbeddingStore(tmp_path, dim=3)
+    assert len(reopened) == 1
+    reopened.put_many(["b"], rows(2))
+    assert reopened.get_many(["b"])["b"][0] == 2
+
+
+def test_rows_written_by_another_process_are_picked_up(tmp_path):
+    reader = MemmapEmbeddingStore(tmp_path, dim=3)
+    MemmapEmbeddingStore(tmp_path, dim=3).put_many(["a"], rows(1))
+
+    assert reader.get_many(["a"])["a"][0] == 1
+
+
+def test_store_rotates_when_full(tmp_path):
+    writer = MemmapEmbeddingStore(tmp_path, dim=3, max_rows=3)
+    reader = MemmapEmbeddingStore(tmp_path, dim=3, max_rows=3)
+    writer.put_many(["a", "b"], rows(1, 2))
+    assert reader.get_many(["a"])["a"][0] == 1
+
+    writer.put_many(["c", "d"], rows(3, 4))
+
+    assert len(writer) == 2
+    assert writer.get_many(["a", "c"]).keys() == {"c"}
+    assert reader.get_many(["d"])["d"][0] == 4
+    assert len(list(tmp_path.glob("vectors.*"))) == 1
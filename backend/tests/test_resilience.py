@@ -0,0 +1,178 @@
+import threading
+
+import pytest
+
+from backend.modules import resilience
+from backend.modules.resilience import (
+    CircuitBreaker, CircuitOpenError, SharedTokenBucket, TokenBucket, Upstream,
+    UpstreamSaturatedError, UpstreamTimeoutError,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(resilience.time, "time", fake.time)
+    monkeypatch.setattr(resilience.time, "sleep", fake.sleep)
+    return fake
+
+
+@pytest.fixture
+def in_process_limits(monkeypatch):
+    monkeypatch.delenv("SHARED_CACHE_PATH", raising=False)
+
+
+# ====================================
+# 🪣 Token buckets
+# ====================================
+def test_token_bucket_allows_a_burst_up_to_capacity(clock):
+    bucket = TokenBucket(rate=3)
+    assert all(bucket.acquire(timeout=0) for _ in range(3))
+    assert not bucket.acquire(timeout=0)
+
+
+def test_token_bucket_waits_for_a_refill_within_the_timeout(clock):
+    bucket = TokenBucket(rate=2)
+    bucket.acquire(timeout=0)
+    bucket.acquire(timeout=0)
+    start = clock.now
+    assert bucket.acquire(timeout=1)
+    assert clock.now - start == pytest.approx(0.5)
+
+
+def test_token_bucket_refuses_when_the_wait_exceeds_the_timeout(clock):
+    bucket = TokenBucket(rate=0.5)
+    bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=1)
+
+
+def test_shared_token_bucket_is_shared_between_instances(clock, tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    first = SharedTokenBucket(path, "pubmed", rate=3)
+    second = SharedTokenBucket(path, "pubmed", rate=3)
+    assert first.acquire(timeout=0) and second.acquire(timeout=0) and first.acquire(timeout=0)
+    assert not second.acquire(timeout=0)
+    clock.sleep(1)
+    assert second.acquire(timeout=0)
+
+
+# ====================================
+# 🔌 Circuit breaker
+# ====================================
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert breaker.retry_after() == pytest.approx(30)
+
+
+def test_breaker_half_open_lets_a_single_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.sleep(30)
+    assert breaker.allow()
+    assert not breaker.allow()  # probe already in flight
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_failed_probe_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.sleep(30)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+
+def test_breaker_cancelled_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.sleep(30)
+    assert breaker.allow()
+    breaker.cancel_probe()
+    assert breaker.allow()
+
+
+# ====================================
+# 🛡️ Upstream.call
+# ====================================
+def test_upstream_open_circuit_skips_the_call(in_process_limits):
+    upstream = Upstream("test", rate=100, max_concurrency=2, timeout=1, failure_threshold=2)
+
+    def failing():
+        raise ConnectionError("down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            upstream.call(failing)
+
+    calls = []
+    with pytest.raises(CircuitOpenError) as exc_info:
+        upstream.call(lambda: calls.append(1))
+    assert calls == []
+    assert exc_info.value.retry_after >= 1
+
+
+def test_upstream_rejects_when_all_slots_are_busy(in_process_limits):
+    upstream = Upstream("test", rate=100, max_concurrency=1, timeout=1)
+    started, release = threading.Event(), threading.Event()
+
+    def hold_slot():
+        started.set()
+        release.wait(5)
+
+    worker = threading.Thread(target=upstream.call, args=(hold_slot,))
+    worker.start()
+    try:
+        started.wait(5)
+        assert upstream.saturated()
+        with pytest.raises(UpstreamSaturatedError):
+            upstream.call(lambda: None, max_wait=0)
+    finally:
+        release.set()
+        worker.join()
+    assert not upstream.saturated()
+    assert upstream.call(lambda: "ok") == "ok"
+
+
+def test_upstream_rejects_when_rate_limited(in_process_limits):
+    upstream = Upstream("test", rate=1, max_concurrency=4, timeout=1)
+    upstream.call(lambda: None)
+    with pytest.raises(UpstreamSaturatedError):
+        upstream.call(lambda: None, max_wait=0)
+
+
+def test_upstream_saturation_does_not_count_as_a_failure(in_process_limits):
+    upstream = Upstream("test", rate=1, max_concurrency=4, timeout=1, failure_threshold=1)
+    upstream.call(lambda: None)
+    with pytest.raises(UpstreamSaturatedError):
+        upstream.call(lambda: None, max_wait=0)
+    assert upstream.breaker.allow()
+
+
+def test_upstream_hard_timeout_abandons_the_call(in_process_limits):
+    upstream = Upstream("test", rate=100, max_concurrency=2, timeout=0.05, failure_threshold=1)
+    done = threading.Event()
+    with pytest.raises(UpstreamTimeoutError):
+        upstream.call(done.wait, 1, hard_timeout=True)
+    done.set()
+    with pytest.raises(CircuitOpenError):
+        upstream.call(lambda: None)
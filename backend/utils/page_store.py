@@ -0,0 +1,47 @@
+import os
+import sqlite3
+import zlib
+from contextlib import closing
+from typing import Dict, List
+
+PAGE_STORE_PATH = os.getenv("PAGE_STORE_PATH", "./page_store.sqlite3")
+
+
+def parent_id_for(report_id: str, page: int) -> str:
+    return f"{report_id}-p{page}"
+
+
+def _connect():
+    conn = sqlite3.connect(PAGE_STORE_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS pages (
+               parent_id TEXT PRIMARY KEY,
+               report_id TEXT NOT NULL,
+               filename  TEXT,
+               page      INTEGER,
+               text      BLOB NOT NULL
+           )"""
+    )
+    return conn
+
+
+def save_page(parent_id: str, report_id: str, filename: str, page: int, text: str):
+    """Store one page of an uploaded report, zlib-compressed."""
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO pages (parent_id, report_id, filename, page, text) VALUES (?, ?, ?, ?, ?)",
+            (parent_id, report_id, filename, page, zlib.compress(text.encode("utf-8"))),
+        )
+
+
+def get_pages(parent_ids: List[str]) -> Dict[str, str]:
+    """Fetch and decompress page text for the given parent IDs (missing IDs are skipped)."""
+    if not parent_ids:
+        return {}
+    placeholders = ",".join("?" for _ in parent_ids)
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            f"SELECT parent_id, text FROM pages WHERE parent_id IN ({placeholders})", list(parent_ids)
+        ).fetchall()
+    return {parent_id: zlib.decompress(blob).decode("utf-8") for parent_id, blob in rows}
@@ -2,9 +2,9 @@ import json
 import os
 from datetime import datetime
 
-REPORT_LOG_FILE = "uploaded_reports.json"
+REPORT_LOG_FILE = os.getenv("REPORT_LOG_FILE", "uploaded_reports.json")
 
-def save_report_metadata(filename: str, chunk_count: int):
+def save_report_metadata(filename: str, chunk_count: int, report_id: str = None, patient_id: str = None):
     """Save metadata for uploaded lab reports."""
     data = []
     if os.path.exists(REPORT_LOG_FILE):
@@ -13,6 +13,8 @@ def save_report_metadata(filename: str, chunk_count: int):
 
     entry = {
         "filename": filename,
+        "report_id": report_id,
+        "patient_id": patient_id,
         "uploaded_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "chunks": chunk_count
     }
@@ -27,3 +29,15 @@ def list_reports():
         return []
     with open(REPORT_LOG_FILE, "r") as f:
         return json.load(f)
+
+def get_report(report_id: str):
+    """Look up a single report's metadata by its report ID."""
+    for entry in list_reports():
+        if entry.get("report_id") == report_id:
+            return entry
+    return None
+
+def find_reports_by_filename(filenames):
+    """All uploads of the given (original) filenames."""
+    wanted = set(filenames)
+    return [entry for entry in list_reports() if entry.get("filename") in wanted]
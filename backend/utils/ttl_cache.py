@@ -0,0 +1,116 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteCache:
+    """Same interface as TTLCache, backed by one SQLite file shared by every worker process.
+
+    Values are pickled; expired rows are dropped lazily and ``maxsize`` is
+    enforced by evicting the entries closest to expiry.
+    """
+
+    def __init__(self, path: str, namespace: str, maxsize: int = 10000, ttl: float = 3600):
+        self.path = path
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS cache (
+                       namespace  TEXT NOT NULL,
+                       key        TEXT NOT NULL,
+                       value      BLOB NOT NULL,
+                       expires_at REAL NOT NULL,
+                       PRIMARY KEY (namespace, key)
+                   )"""
+            )
+
+    def _conn(self):
+        # One connection per thread (and per process — a forked worker opens its own)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (self.namespace, str(key))
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, str(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at),
+            )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._evict()
+
+    def delete(self, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, str(key)))
+
+    def _evict(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND expires_at < ?", (self.namespace, time.time()))
+            conn.execute(
+                """DELETE FROM cache WHERE namespace = ? AND key IN (
+                       SELECT key FROM cache WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                   )""",
+                (self.namespace, self.namespace, self.maxsize),
+            )
+
+
+def get_shared_cache(namespace: str, maxsize: int = 1024, ttl: float = 3600):
+    """SQLite-backed cache when SHARED_CACHE_PATH is set (multi-worker mode), else an in-process TTLCache."""
+    path = os.getenv("SHARED_CACHE_PATH")
+    if path:
+        return SQLiteCache(path, namespace, maxsize=maxsize, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)